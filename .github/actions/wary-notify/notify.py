@@ -1,44 +1,164 @@
 """Notify action script for GitHub Actions."""
 
+import asyncio
+import gzip
 import os
+import random
+import re
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Optional
+
 import requests
+
 from wary import ResultsLedger
 
+try:
+    import orjson
 
-def main():
-    upstream = os.environ['UPSTREAM']
-    version = os.environ['VERSION']
-    method = os.environ['METHOD']
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
 
-    ledger = ResultsLedger()
+except ImportError:
+    import json
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Concurrent GitHub API requests; keeps us under the secondary rate limit
+MAX_CONCURRENT_REQUESTS = 8
+# Retries for rate-limited (403/429) GitHub API responses
+MAX_RETRIES = 5
+# Slack rejects messages with more blocks than this
+SLACK_MAX_BLOCKS = 50
+# owner/repo from https://github.com/owner/repo or git@github.com:owner/repo.git
+GITHUB_REPO_RE = re.compile(r'github\.com[:/]([^/]+)/([^/]+?)(?:\.git)?/?$')
+ISSUE_LABELS = ['dependency-test-failure', 'wary']
+
+ISSUE_BODY_TEMPLATE = """
+## Test Failure Report
+
+Your package **{downstream_package}** failed tests with **{upstream}@{version}**.
+
+### Details
+- Test ID: `{test_id}`
+- Status: {status}
+- Started: {started_at}
+- Duration: {finished_at}
+
+### Output
+```
+{output}
+```
+
+This issue was automatically created by [wary](https://github.com/thorwhalen/wary).
+"""
+
+TRACKING_BODY_TEMPLATE = """
+## Dependent Test Failures
 
-    # Get recent failures
-    failures = ledger.query_results(upstream_package=upstream, status='fail')
+**{count}** dependent packages failed tests with **{upstream}@{version}**.
 
-    # Filter to this version
-    failures = [r for r in failures if r['upstream_version'] == version]
+{checklist}
 
-    if not failures:
+This issue was automatically created by [wary](https://github.com/thorwhalen/wary).
+"""
+
+TRACKING_ITEM_TEMPLATE = (
+    "- [ ] **{downstream_package}** ({status}) - Test ID: `{test_id}`"
+)
+
+# Webhook bodies at least this large are sent gzip-compressed
+GZIP_MIN_BYTES = 1024
+# Characters of test output each notification method includes
+OUTPUT_LIMITS = {'github-issue': 1000, 'webhook': 500}
+
+
+@dataclass(frozen=True)
+class Config:
+    """Action settings, read from the environment once at startup."""
+
+    upstream: str
+    version: str
+    method: str
+    github_token: Optional[str] = None
+    github_repository: Optional[str] = None
+    aggregate_issues: bool = False
+    webhook_url: Optional[str] = None
+    slack_webhook: Optional[str] = None
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(
+            upstream=env['UPSTREAM'],
+            version=env['VERSION'],
+            method=env['METHOD'],
+            github_token=env.get('GITHUB_TOKEN'),
+            github_repository=env.get('GITHUB_REPOSITORY'),
+            aggregate_issues=env.get('AGGREGATE_ISSUES') == '1',
+            webhook_url=env.get('WEBHOOK_URL'),
+            slack_webhook=env.get('SLACK_WEBHOOK'),
+        )
+
+
+def main():
+    cfg = Config.from_env()
+    upstream, version, method = cfg.upstream, cfg.version, cfg.method
+
+    ledger = ResultsLedger()
+
+    if not ledger.has_results(
+        upstream_package=upstream, upstream_version=version, status='fail'
+    ):
         print("No failures to notify")
         return
 
+    # Get failures for this version
+    failures = ledger.query_results(
+        upstream_package=upstream,
+        upstream_version=version,
+        status='fail',
+        output_limit=OUTPUT_LIMITS.get(method, 0),
+    )
+
     print(f"Found {len(failures)} failures for {upstream}@{version}")
 
     if method == 'github-issue':
-        create_github_issues(upstream, version, failures)
+        create_github_issues(cfg, failures)
     elif method == 'webhook':
-        send_webhook(upstream, version, failures)
+        send_webhook(cfg, failures)
     elif method == 'slack':
-        send_slack(upstream, version, failures)
+        send_slack(cfg, failures)
+
 
+def create_github_issues(cfg, failures):
+    """Create GitHub issues for failures.
 
-def create_github_issues(upstream, version, failures):
-    """Create GitHub issues for failures."""
-    token = os.environ.get('GITHUB_TOKEN')
+    With ``AGGREGATE_ISSUES=1``, open a single tracking issue in this
+    repository listing every failing dependent instead of one issue each.
+    """
+    upstream, version, token = cfg.upstream, cfg.version, cfg.github_token
     if not token:
         print("GITHUB_TOKEN not set")
         return
 
+    if cfg.aggregate_issues:
+        repo = cfg.github_repository
+        if not repo:
+            print("GITHUB_REPOSITORY not set")
+            return
+        issue_data = _tracking_issue_data(upstream, version, failures)
+        asyncio.run(_create_github_issues([(repo, repo, issue_data)], token))
+        return
+
+    # Parse repos up front so only dispatchable failures reach the event loop
+    issues = []
     for failure in failures:
         downstream = failure['downstream_package']
 
@@ -50,53 +170,152 @@ def create_github_issues(upstream, version, failures):
             print(f"No GitHub repo URL for {downstream}, skipping")
             continue
 
-        # Parse repo from URL
-        # e.g., https://github.com/owner/repo -> owner/repo
-        parts = repo_url.rstrip('/').split('/')
-        if len(parts) >= 2:
-            owner_repo = f"{parts[-2]}/{parts[-1]}"
-        else:
+        owner_repo = _parse_owner_repo(repo_url)
+        if owner_repo is None:
             print(f"Could not parse repo from {repo_url}")
             continue
 
-        # Create issue
-        issue_data = {
-            'title': f"Test failure with {upstream}@{version}",
-            'body': f"""
-## Test Failure Report
+        issues.append(
+            (downstream, owner_repo, _failure_issue_data(upstream, version, failure))
+        )
 
-Your package **{downstream}** failed tests with **{upstream}@{version}**.
+    if issues:
+        asyncio.run(_create_github_issues(issues, token))
 
-### Details
-- Test ID: `{failure['test_id']}`
-- Status: {failure['status']}
-- Started: {failure['started_at']}
-- Duration: {failure['finished_at']}
 
-### Output
-```
-{failure['output'][:1000]}
-```
+@lru_cache(maxsize=None)
+def _parse_owner_repo(repo_url):
+    """Parse owner/repo from a GitHub URL, or None if it doesn't match.
 
-This issue was automatically created by [wary](https://github.com/thorwhalen/wary).
-            """,
-            'labels': ['dependency-test-failure', 'wary'],
-        }
+    e.g., https://github.com/owner/repo -> owner/repo
+    """
+    match = GITHUB_REPO_RE.search(repo_url)
+    if match:
+        return f"{match.group(1)}/{match.group(2)}"
+    return None
 
-        url = f"https://api.github.com/repos/{owner_repo}/issues"
-        response = requests.post(
-            url, json=issue_data, headers={'Authorization': f'token {token}'}
+
+def _failure_issue_data(upstream, version, failure):
+    """Issue payload reporting one dependent's failure to its maintainers."""
+    return {
+        'title': f"Test failure with {upstream}@{version}",
+        'body': ISSUE_BODY_TEMPLATE.format_map(
+            failure
+            | {
+                'upstream': upstream,
+                'version': version,
+                'output': failure['output'][:1000],
+            }
+        ),
+        'labels': ISSUE_LABELS,
+    }
+
+
+def _tracking_issue_data(upstream, version, failures):
+    """Issue payload listing all failing dependents as a checklist."""
+    checklist = '\n'.join(map(TRACKING_ITEM_TEMPLATE.format_map, failures))
+    return {
+        'title': f"Dependent test failures with {upstream}@{version}",
+        'body': TRACKING_BODY_TEMPLATE.format(
+            count=len(failures), upstream=upstream, version=version, checklist=checklist
+        ),
+        'labels': ISSUE_LABELS,
+    }
+
+
+async def _create_github_issues(issues, token):
+    """Post all issues concurrently, bounded by a semaphore.
+
+    Requests are multiplexed over a single pooled HTTP/2 connection.
+
+    Args:
+        issues: ``(label, owner_repo, issue_data)`` tuples
+        token: GitHub token
+    """
+    import httpx
+
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limits = httpx.Limits(
+        max_connections=MAX_CONCURRENT_REQUESTS,
+        max_keepalive_connections=MAX_CONCURRENT_REQUESTS,
+    )
+    headers = {'Authorization': f'token {token}'}
+
+    async with httpx.AsyncClient(
+        http2=True, headers=headers, limits=limits, timeout=30
+    ) as client:
+        await asyncio.gather(
+            *(
+                _post_issue(client, sem, label, owner_repo, issue_data)
+                for label, owner_repo, issue_data in issues
+            )
         )
 
-        if response.ok:
-            print(f"✓ Created issue for {downstream}: {response.json()['html_url']}")
-        else:
-            print(f"✗ Failed to create issue for {downstream}: {response.text}")
 
+async def _post_issue(client, sem, label, owner_repo, issue_data):
+    """Create a single GitHub issue."""
+    url = f"https://api.github.com/repos/{owner_repo}/issues"
+    async with sem:
+        ok, body = await _post_with_ratelimit(
+            client, url, content=_dumps(issue_data), headers=JSON_HEADERS
+        )
+
+    if ok:
+        print(f"✓ Created issue for {label}: {body['html_url']}")
+    else:
+        print(f"✗ Failed to create issue for {label}: {body}")
+
+
+async def _post_with_ratelimit(client, url, **kwargs):
+    """POST to the GitHub API, backing off when rate limited.
+
+    Honors ``Retry-After`` on 403/429 responses (doubling the delay with jitter
+    on each retry). Before retrying, also sleeps until ``X-RateLimit-Reset`` if
+    the primary quota is about to run out.
 
-def send_webhook(upstream, version, failures):
+    Returns:
+        ``(ok, body)`` where body is the decoded JSON on success, else the text
+    """
+    delay = 1
+    for attempt in range(MAX_RETRIES + 1):
+        response = await client.post(url, **kwargs)
+        headers = response.headers
+        status = response.status_code
+        body = response.json() if response.is_success else response.text
+
+        remaining = headers.get('X-RateLimit-Remaining')
+        rate_limited = status == 429 or (
+            status == 403 and ('Retry-After' in headers or remaining == '0')
+        )
+        if not rate_limited or attempt == MAX_RETRIES:
+            return status < 400, body
+
+        wait = max(_retry_after_seconds(headers.get('Retry-After'), delay), delay)
+        if remaining is not None and int(remaining) <= 1:
+            reset = int(headers.get('X-RateLimit-Reset', '0'))
+            wait = max(wait, reset - time.time())
+        await asyncio.sleep(wait + random.uniform(0, 0.5))
+        delay *= 2
+
+
+def _retry_after_seconds(value, default):
+    """Seconds to wait per a ``Retry-After`` value: delay-seconds or an HTTP-date."""
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(retry_at.timestamp() - time.time(), 0)
+
+
+def send_webhook(cfg, failures):
     """Send webhook notification."""
-    url = os.environ.get('WEBHOOK_URL')
+    upstream, version, url = cfg.upstream, cfg.version, cfg.webhook_url
     if not url:
         print("WEBHOOK_URL not set")
         return
@@ -114,19 +333,29 @@ def send_webhook(upstream, version, failures):
         ],
     }
 
-    response = requests.post(url, json=data)
+    body = _dumps(data)
+    if len(body) >= GZIP_MIN_BYTES:
+        response = requests.post(
+            url,
+            data=gzip.compress(body, compresslevel=6),
+            headers={**JSON_HEADERS, 'Content-Encoding': 'gzip'},
+        )
+        if response.status_code == 415:
+            # Receiver doesn't accept compressed bodies
+            response = requests.post(url, data=body, headers=JSON_HEADERS)
+    else:
+        response = requests.post(url, data=body, headers=JSON_HEADERS)
     print(f"Webhook sent: {response.status_code}")
 
 
-def send_slack(upstream, version, failures):
+def send_slack(cfg, failures):
     """Send Slack notification."""
-    webhook_url = os.environ.get('SLACK_WEBHOOK')
+    upstream, version, webhook_url = cfg.upstream, cfg.version, cfg.slack_webhook
     if not webhook_url:
         print("SLACK_WEBHOOK not set")
         return
 
-    # Format message
-    blocks = [
+    header = [
         {
             'type': 'header',
             'text': {
@@ -142,25 +371,33 @@ def send_slack(upstream, version, failures):
             },
         },
     ]
+    failure_blocks = [
+        {
+            'type': 'section',
+            'text': {
+                'type': 'mrkdwn',
+                'text': f"• *{failure['downstream_package']}*\n  Status: {failure['status']}\n  Test ID: `{failure['test_id']}`",
+            },
+        }
+        for failure in failures
+    ]
 
-    for failure in failures[:5]:  # Limit to 5
-        blocks.append(
-            {
-                'type': 'section',
-                'text': {
-                    'type': 'mrkdwn',
-                    'text': f"• *{failure['downstream_package']}*\n  Status: {failure['status']}\n  Test ID: `{failure['test_id']}`",
-                },
-            }
-        )
-
-    message = {'blocks': blocks}
+    # The first message carries the header; every message stays within Slack's
+    # per-message block limit
+    blocks = header + failure_blocks
+    chunks = [
+        blocks[i : i + SLACK_MAX_BLOCKS]
+        for i in range(0, len(blocks), SLACK_MAX_BLOCKS)
+    ]
 
-    response = requests.post(webhook_url, json=message)
-    if response.ok:
-        print(f"✓ Slack notification sent")
-    else:
-        print(f"✗ Failed to send Slack notification: {response.text}")
+    for i, chunk in enumerate(chunks, 1):
+        response = requests.post(
+            webhook_url, data=_dumps({'blocks': chunk}), headers=JSON_HEADERS
+        )
+        if response.ok:
+            print(f"✓ Slack notification sent ({i}/{len(chunks)})")
+        else:
+            print(f"✗ Failed to send Slack notification: {response.text}")
 
 
 if __name__ == '__main__':
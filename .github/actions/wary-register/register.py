@@ -2,34 +2,78 @@
 
 import os
 import sys
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class Config:
+    """Action settings, read from the environment once at startup."""
+
+    upstream_packages: tuple[str, ...]
+    test_command: str
+    repo_name: str
+    repo_url: str
+    api_url: Optional[str] = None
+    api_key: Optional[str] = None
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(
+            upstream_packages=tuple(env['UPSTREAM'].split(',')),
+            test_command=env['TEST_CMD'],
+            repo_name=env['REPO_NAME'],
+            repo_url=env['REPO_URL'],
+            api_url=env.get('API_URL'),
+            api_key=env.get('API_KEY'),
+        )
 
 
 def main():
-    upstream_packages = os.environ['UPSTREAM'].split(',')
-    test_command = os.environ['TEST_CMD']
-    repo_name = os.environ['REPO_NAME']
-    repo_url = os.environ['REPO_URL']
-    api_url = os.environ.get('API_URL')
-    api_key = os.environ.get('API_KEY')
+    cfg = Config.from_env()
+    upstream_packages = cfg.upstream_packages
+    test_command = cfg.test_command
+    repo_name = cfg.repo_name
+    repo_url = cfg.repo_url
+    api_url = cfg.api_url
+    api_key = cfg.api_key
 
     if api_url:
         # Register via API (Phase 3)
         import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
 
-        for upstream in upstream_packages:
-            response = requests.post(
-                f"{api_url}/api/dependents",
-                json={
-                    'upstream': upstream.strip(),
-                    'downstream': repo_name,
-                    'test_command': test_command,
-                    'repo_url': repo_url,
-                },
-                headers={'Authorization': f'Bearer {api_key}'},
-            )
-            print(f"Registered {repo_name} → {upstream}: {response.status_code}")
-            if response.status_code >= 400:
-                print(f"Error: {response.text}")
+        # Keep-alive session; retries reuse the pooled connection
+        session = requests.Session()
+        session.headers.update({'Authorization': f'Bearer {api_key}'})
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=1,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=[429, 502, 503],
+                allowed_methods=None,
+            ),
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        upstreams = [upstream.strip() for upstream in upstream_packages]
+        response = session.post(
+            f"{api_url}/api/dependents/bulk",
+            json={
+                'upstreams': upstreams,
+                'downstream': repo_name,
+                'test_command': test_command,
+                'repo_url': repo_url,
+            },
+        )
+        print(f"Registered {repo_name} → {', '.join(upstreams)}: {response.status_code}")
+        if response.status_code >= 400:
+            print(f"Error: {response.text}")
     else:
         # Register locally (Phase 1/2)
         from wary import DependencyGraph
@@ -1,25 +1,64 @@
 """Test action script for GitHub Actions."""
 
+import asyncio
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+# Result statuses that trigger fail-fast (a skipped dependent doesn't)
+FAILED_STATUSES = ('fail', 'error')
+
+
+@dataclass(frozen=True)
+class Config:
+    """Action settings, read from the environment once at startup."""
+
+    package_name: Optional[str] = None
+    package_version: Optional[str] = None
+    api_url: Optional[str] = None
+    api_key: Optional[str] = None
+    max_parallel: int = 3
+    github_repo: Optional[str] = None
+    github_ref: Optional[str] = None
+    fail_fast: bool = False
+    backend: str = ''
+    sqlite_path: Optional[str] = None
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(
+            package_name=env.get('PKG_NAME'),
+            package_version=env.get('PKG_VERSION'),
+            api_url=env.get('API_URL'),
+            api_key=env.get('API_KEY'),
+            max_parallel=int(env.get('MAX_PARALLEL', '3')),
+            github_repo=env.get('GITHUB_REPO'),
+            github_ref=env.get('GITHUB_REF'),
+            fail_fast=env.get('FAIL_FAST') == '1',
+            backend=env.get('WARY_BACKEND', '').lower(),
+            sqlite_path=env.get('WARY_SQLITE_PATH'),
+        )
 
 
 def main():
-    package_name = os.environ.get('PKG_NAME')
-    package_version = os.environ.get('PKG_VERSION')
-    api_url = os.environ.get('API_URL')
-    api_key = os.environ.get('API_KEY')
-    max_parallel = int(os.environ.get('MAX_PARALLEL', '3'))
+    cfg = Config.from_env()
+    package_name = cfg.package_name
+    package_version = cfg.package_version
+    api_url = cfg.api_url
+    api_key = cfg.api_key
+    max_parallel = cfg.max_parallel
 
     # Auto-detect package name from repo
     if not package_name:
-        repo = os.environ['GITHUB_REPO']
+        repo = cfg.github_repo
         package_name = repo.split('/')[-1].replace('-', '_')
 
     # Auto-detect version from git tag
     if not package_version:
-        ref = os.environ['GITHUB_REF']
+        ref = cfg.github_ref
         if ref.startswith('refs/tags/v'):
             package_version = ref.replace('refs/tags/v', '')
         elif ref.startswith('refs/tags/'):
@@ -47,10 +86,10 @@ def main():
             sys.exit(1)
     else:
         # Run locally
-        from wary import DependencyGraph, TestOrchestrator
+        from wary import TestOrchestrator
 
-        graph = DependencyGraph()
-        orchestrator = TestOrchestrator()
+        graph, ledger = _local_stores(cfg)
+        orchestrator = TestOrchestrator(results_ledger=ledger)
 
         dependents = graph.get_dependents(package_name)
         print(f"Found {len(dependents)} dependents")
@@ -59,35 +98,27 @@ def main():
             print("No dependents to test")
             return
 
-        # Test in parallel
-        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
-            futures = []
-            for edge in dependents:
-                downstream = edge['downstream']
-                test_cmd = edge['metadata'].get('test_command', 'pytest')
-
-                future = executor.submit(
-                    orchestrator.run_test,
-                    upstream_package=package_name,
-                    upstream_version=package_version,
-                    downstream_package=downstream,
-                    test_command=test_cmd,
+        if len(dependents) == 1:
+            # Nothing to run concurrently; call straight through
+            status_counts = _test_single_dependent(
+                orchestrator, package_name, package_version, dependents[0]
+            )
+        else:
+            # Test concurrently, at most max_parallel at a time
+            status_counts = asyncio.run(
+                _test_dependents(
+                    orchestrator,
+                    package_name,
+                    package_version,
+                    dependents,
+                    max_parallel,
+                    fail_fast=cfg.fail_fast,
                 )
-                futures.append((downstream, future))
-
-            results = []
-            for downstream, future in futures:
-                try:
-                    result = future.result(timeout=600)
-                    results.append(result)
-                    status_emoji = '✓' if result['status'] == 'pass' else '✗'
-                    print(f"{status_emoji} {downstream}: {result['status']}")
-                except Exception as e:
-                    print(f"✗ {downstream}: ERROR - {e}")
+            )
 
         # Summary
-        passed = sum(1 for r in results if r['status'] == 'pass')
-        failed = sum(1 for r in results if r['status'] == 'fail')
+        passed = status_counts['pass']
+        failed = status_counts['fail']
 
         print(f"\nSummary: {passed} passed, {failed} failed")
 
@@ -97,5 +128,91 @@ def main():
             # sys.exit(1)
 
 
+def _local_stores(cfg):
+    """The graph and ledger selected by WARY_BACKEND (as the API server does)."""
+    if cfg.backend == 'sqlite':
+        from wary.stores import SQLiteDependencyGraph, SQLiteResultsLedger
+
+        graph = SQLiteDependencyGraph(cfg.sqlite_path)
+        return graph, SQLiteResultsLedger(cfg.sqlite_path)
+
+    from wary import DependencyGraph, ResultsLedger
+
+    return DependencyGraph(), ResultsLedger()
+
+
+def _test_single_dependent(orchestrator, package_name, package_version, edge):
+    """Run one dependent's tests inline, returning a Counter of statuses."""
+    downstream = edge['downstream']
+    try:
+        result = orchestrator.run_test(
+            upstream_package=package_name,
+            upstream_version=package_version,
+            downstream_package=downstream,
+            test_command=edge['metadata'].get('test_command', 'pytest'),
+        )
+    except Exception as e:
+        print(f"✗ {downstream}: ERROR - {e}")
+        return Counter()
+
+    status_emoji = '✓' if result['status'] == 'pass' else '✗'
+    print(f"{status_emoji} {downstream}: {result['status']}")
+    return Counter([result['status']])
+
+
+async def _test_dependents(
+    orchestrator, package_name, package_version, dependents, max_parallel, fail_fast=False
+):
+    """Run the dependents' tests on one event loop, bounded by a semaphore.
+
+    Results are reported and counted as soon as each test finishes. With
+    ``fail_fast``, pending tests are cancelled after the first failure.
+
+    Returns:
+        Counter of result statuses
+    """
+    sem = asyncio.Semaphore(max_parallel)
+
+    async def _bounded(edge):
+        async with sem:
+            return await orchestrator.arun_test(
+                upstream_package=package_name,
+                upstream_version=package_version,
+                downstream_package=edge['downstream'],
+                test_command=edge['metadata'].get('test_command', 'pytest'),
+            )
+
+    task_to_name = {
+        asyncio.create_task(_bounded(edge)): edge['downstream'] for edge in dependents
+    }
+
+    status_counts = Counter()
+    pending = set(task_to_name)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        failed = False
+        for task in done:
+            downstream = task_to_name[task]
+            try:
+                result = task.result()
+            except Exception as e:
+                print(f"✗ {downstream}: ERROR - {e}")
+                failed = True
+                continue
+            status_counts[result['status']] += 1
+            status_emoji = '✓' if result['status'] == 'pass' else '✗'
+            print(f"{status_emoji} {downstream}: {result['status']}")
+            failed = failed or result['status'] in FAILED_STATUSES
+
+        if failed and fail_fast and pending:
+            print(f"Fail-fast: cancelling {len(pending)} pending tests")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            break
+
+    return status_counts
+
+
 if __name__ == '__main__':
     main()
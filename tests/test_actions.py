@@ -0,0 +1,151 @@
+"""Tests for the GitHub Actions scripts under .github/actions."""
+
+import asyncio
+import importlib.util
+import time
+from email.utils import formatdate
+from pathlib import Path
+
+import httpx
+import pytest
+
+ACTIONS_DIR = Path(__file__).parent.parent / ".github" / "actions"
+
+
+def _load_action_script(action: str, script: str):
+    """Import an action's script (they aren't part of the package)."""
+    spec = importlib.util.spec_from_file_location(
+        f"{action.replace('-', '_')}_{script}", ACTIONS_DIR / action / f"{script}.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def notify(monkeypatch):
+    """The notify script, with its sleeps recorded instead of slept."""
+    module = _load_action_script("wary-notify", "notify")
+    module.sleeps = []
+
+    async def fake_sleep(seconds):
+        module.sleeps.append(seconds)
+
+    monkeypatch.setattr(module.asyncio, "sleep", fake_sleep)
+    return module
+
+
+def _post(notify, responses):
+    """Run `_post_with_ratelimit` against a transport replaying ``responses``."""
+    responses = iter(responses)
+    transport = httpx.MockTransport(lambda request: next(responses))
+
+    async def post():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await notify._post_with_ratelimit(client, "https://api.github.com/x")
+
+    return asyncio.run(post())
+
+
+def test_retry_after_seconds(notify):
+    """Retry-After may be delay-seconds or an HTTP-date."""
+    assert notify._retry_after_seconds("7", 1) == 7
+    assert 25 < notify._retry_after_seconds(formatdate(time.time() + 30, usegmt=True), 1) <= 30
+    assert notify._retry_after_seconds("soon", 1) == 1
+    assert notify._retry_after_seconds(None, 4) == 4
+
+
+def test_post_retries_when_rate_limited(notify):
+    """A 429 is retried after its (HTTP-date) Retry-After."""
+    retry_at = formatdate(time.time() + 30, usegmt=True)
+    ok, body = _post(
+        notify,
+        [
+            httpx.Response(429, headers={"Retry-After": retry_at}, text="slow down"),
+            httpx.Response(201, json={"html_url": "https://github.com/o/r/issues/1"}),
+        ],
+    )
+    assert ok and body["html_url"].endswith("/issues/1")
+    assert len(notify.sleeps) == 1 and 25 < notify.sleeps[0] <= 31
+
+
+def test_post_waits_for_quota_reset_before_retrying(notify):
+    """An exhausted quota is waited out, but only when retrying."""
+    reset = str(int(time.time()) + 600)
+    exhausted = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset}
+    ok, _ = _post(
+        notify,
+        [
+            httpx.Response(403, headers=exhausted, text="rate limited"),
+            httpx.Response(201, headers=exhausted, json={}),
+        ],
+    )
+    assert ok
+    # Slept once, until the reset; not again after the successful post
+    assert len(notify.sleeps) == 1 and notify.sleeps[0] > 590
+
+
+def test_post_gives_up_after_max_retries(notify):
+    """Rate limiting past MAX_RETRIES returns the last failure."""
+    ok, body = _post(
+        notify, [httpx.Response(429, text="slow down")] * (notify.MAX_RETRIES + 1)
+    )
+    assert not ok and body == "slow down"
+    assert len(notify.sleeps) == notify.MAX_RETRIES
+
+
+def test_post_failure_is_not_retried(notify):
+    """Errors other than rate limiting are returned at once."""
+    ok, body = _post(notify, [httpx.Response(404, text="Not Found")])
+    assert (ok, body) == (False, "Not Found")
+    assert notify.sleeps == []
+
+
+class FakeOrchestrator:
+    """Stands in for TestOrchestrator: each dependent's status is looked up.
+
+    Passing tests take a little while; failing ones fail at once.
+    """
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    async def arun_test(self, upstream_package, upstream_version, downstream_package, test_command):
+        status = self.statuses[downstream_package]
+        if status == 'hang':
+            await asyncio.Event().wait()
+        await asyncio.sleep(0.01 if status == 'pass' else 0)
+        return {'status': status}
+
+
+def _edges(*downstreams):
+    return [{'downstream': d, 'metadata': {}} for d in downstreams]
+
+
+@pytest.mark.parametrize('status', ['fail', 'error'])
+def test_fail_fast_cancels_pending_tests(status):
+    """With fail_fast, a failure cancels the dependents still running."""
+    test_action = _load_action_script("wary-test", "test")
+    orchestrator = FakeOrchestrator({'bad': status, 'slow': 'hang', 'queued': 'pass'})
+
+    counts = asyncio.run(
+        test_action._test_dependents(
+            orchestrator, 'dol', '1.0', _edges('bad', 'slow', 'queued'), 2, fail_fast=True
+        )
+    )
+
+    assert counts == {status: 1}
+
+
+def test_fail_fast_ignores_skips():
+    """A skipped dependent doesn't trigger fail-fast."""
+    test_action = _load_action_script("wary-test", "test")
+    orchestrator = FakeOrchestrator({'skipped': 'skip', 'ok': 'pass', 'other': 'pass'})
+
+    counts = asyncio.run(
+        test_action._test_dependents(
+            orchestrator, 'dol', '1.0', _edges('skipped', 'ok', 'other'), 1, fail_fast=True
+        )
+    )
+
+    assert counts == {'skip': 1, 'pass': 2}
@@ -0,0 +1,44 @@
+"""Tests for wary.api module."""
+
+import pytest
+
+from wary import api
+from wary.orchestrator import TestOrchestrator
+from tests.test_ledger import create_test_result
+
+
+def _clear_instances():
+    for factory in (api.get_graph, api.get_ledger, api.get_orchestrator, api.get_watcher):
+        factory.cache_clear()
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path, monkeypatch):
+    """Point the shared instances at a per-test SQLite database."""
+    monkeypatch.setenv("WARY_BACKEND", "sqlite")
+    monkeypatch.setenv("WARY_SQLITE_PATH", str(tmp_path / "wary.db"))
+    monkeypatch.delenv("WARY_API_KEY", raising=False)
+    _clear_instances()
+    yield
+    _clear_instances()
+
+
+def test_orchestrator_records_to_configured_ledger(sqlite_backend, monkeypatch):
+    """Results of /api/test show up in /api/results with the SQLite backend."""
+
+    async def fake_arun_test(self, upstream_package, upstream_version, downstream_package, **kwargs):
+        result = create_test_result(test_id=f"test-{downstream_package}", status="fail")
+        result["downstream_package"] = downstream_package
+        return result
+
+    monkeypatch.setattr(TestOrchestrator, "arun_test", fake_arun_test)
+    api.get_graph().register_dependent(upstream="dol", downstream="my-package")
+
+    client = api.create_app().test_client()
+    response = client.post("/api/test", json={"upstream": "dol", "version": "0.2.51"})
+    assert response.status_code == 200
+    assert response.get_json()["failed"] == 1
+
+    results = client.get("/api/results?upstream=dol").get_json()["results"]
+    assert [r["test_id"] for r in results] == ["test-my-package"]
+    assert api.get_orchestrator().results_ledger is api.get_ledger()
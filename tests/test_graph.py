@@ -1,86 +1,151 @@
 """Tests for wary.graph module."""
 
-import tempfile
-from pathlib import Path
+import os
+
 import pytest
 
 from wary import DependencyGraph
 
 
-def test_register_dependent():
-    """Test registering a dependent package."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        graph = DependencyGraph(store_path=tmpdir)
+@pytest.fixture
+def graph(tmp_path):
+    """A fresh graph backed by a per-test directory."""
+    return DependencyGraph(store_path=str(tmp_path))
 
-        graph.register_dependent(
-            upstream="dol", downstream="my-package", test_command="pytest"
-        )
 
-        dependents = graph.get_dependents("dol")
-        assert len(dependents) == 1
-        assert dependents[0]["downstream"] == "my-package"
-        assert dependents[0]["metadata"]["test_command"] == "pytest"
+def test_register_dependent(graph):
+    """Test registering a dependent package."""
+    graph.register_dependent(
+        upstream="dol", downstream="my-package", test_command="pytest"
+    )
+
+    dependents = graph.get_dependents("dol")
+    assert len(dependents) == 1
+    assert dependents[0]["downstream"] == "my-package"
+    assert dependents[0]["metadata"]["test_command"] == "pytest"
 
 
-def test_get_dependents_empty():
+def test_get_dependents_empty(graph):
     """Test getting dependents for non-existent package."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        graph = DependencyGraph(store_path=tmpdir)
-        assert graph.get_dependents("nonexistent") == []
+    assert graph.get_dependents("nonexistent") == []
 
 
-def test_multiple_dependents():
+def test_multiple_dependents(graph):
     """Test registering multiple dependents."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        graph = DependencyGraph(store_path=tmpdir)
+    graph.register_dependent(upstream="dol", downstream="package1")
+    graph.register_dependent(upstream="dol", downstream="package2")
+    graph.register_dependent(upstream="dol", downstream="package3")
 
-        graph.register_dependent(upstream="dol", downstream="package1")
-        graph.register_dependent(upstream="dol", downstream="package2")
-        graph.register_dependent(upstream="dol", downstream="package3")
+    dependents = graph.get_dependents("dol")
+    assert len(dependents) == 3
 
-        dependents = graph.get_dependents("dol")
-        assert len(dependents) == 3
 
-
-def test_update_dependent():
+def test_update_dependent(graph):
     """Test updating an existing dependent."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        graph = DependencyGraph(store_path=tmpdir)
-
-        graph.register_dependent(
-            upstream="dol", downstream="my-package", test_command="pytest"
-        )
-        graph.register_dependent(
-            upstream="dol", downstream="my-package", test_command="pytest -v"
-        )
+    graph.register_dependent(
+        upstream="dol", downstream="my-package", test_command="pytest"
+    )
+    graph.register_dependent(
+        upstream="dol", downstream="my-package", test_command="pytest -v"
+    )
 
-        dependents = graph.get_dependents("dol")
-        assert len(dependents) == 1
-        assert dependents[0]["metadata"]["test_command"] == "pytest -v"
+    dependents = graph.get_dependents("dol")
+    assert len(dependents) == 1
+    assert dependents[0]["metadata"]["test_command"] == "pytest -v"
 
 
-def test_get_all_edges():
+def test_get_all_edges(graph):
     """Test getting all edges from graph."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        graph = DependencyGraph(store_path=tmpdir)
+    graph.register_dependent(upstream="dol", downstream="package1")
+    graph.register_dependent(upstream="i2", downstream="package2")
+    graph.register_dependent(upstream="qh", downstream="package3")
+
+    edges = graph.get_all_edges()
+    assert len(edges) == 3
+
+
+def test_data_version(graph):
+    """Test that the data version changes when edges change."""
+    before = graph.data_version()
+    graph.register_dependent(upstream="dol", downstream="package1")
+    assert graph.data_version() != before
 
-        graph.register_dependent(upstream="dol", downstream="package1")
-        graph.register_dependent(upstream="i2", downstream="package2")
-        graph.register_dependent(upstream="qh", downstream="package3")
 
-        edges = graph.get_all_edges()
-        assert len(edges) == 3
+def test_dependent_counts(graph):
+    """Test counting dependents per upstream package."""
+    graph.register_dependent(upstream="dol", downstream="package1")
+    graph.register_dependent(upstream="dol", downstream="package2")
+    graph.register_dependent(upstream="i2", downstream="package3")
 
+    assert graph.dependent_counts().most_common(1) == [("dol", 2)]
+    assert graph.dependent_counts()["i2"] == 1
 
-def test_graph_persistence():
+
+def test_graph_persistence(tmp_path):
     """Test that graph data persists across instances."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        # Create first instance and add data
-        graph1 = DependencyGraph(store_path=tmpdir)
-        graph1.register_dependent(upstream="dol", downstream="my-package")
-
-        # Create second instance and verify data persists
-        graph2 = DependencyGraph(store_path=tmpdir)
-        dependents = graph2.get_dependents("dol")
-        assert len(dependents) == 1
-        assert dependents[0]["downstream"] == "my-package"
+    # Create first instance and add data
+    graph1 = DependencyGraph(store_path=str(tmp_path))
+    graph1.register_dependent(upstream="dol", downstream="my-package")
+
+    # Create second instance and verify data persists
+    graph2 = DependencyGraph(store_path=str(tmp_path))
+    dependents = graph2.get_dependents("dol")
+    assert len(dependents) == 1
+    assert dependents[0]["downstream"] == "my-package"
+
+
+def test_get_all_edges_tracks_updates(tmp_path):
+    """Test that get_all_edges reflects rewrites, deletes and pre-existing data."""
+    graph = DependencyGraph(store_path=str(tmp_path))
+    graph.register_dependent(upstream="dol", downstream="package1")
+    assert len(graph.get_all_edges()) == 1
+
+    graph.register_dependent(upstream="dol", downstream="package1")
+    graph.register_dependent(upstream="i2", downstream="package2")
+    del graph["dol"]
+    assert [e["upstream"] for e in graph.get_all_edges()] == ["i2"]
+
+    # Data written before the edges log existed is still found
+    (tmp_path / ".edges.jsonl").unlink()
+    graph.register_dependent(upstream="qh", downstream="package3")
+    assert len(DependencyGraph(store_path=str(tmp_path)).get_all_edges()) == 2
+
+
+def test_len(graph):
+    """Test counting upstream packages."""
+    assert len(graph) == 0
+
+    graph.register_dependent(upstream="dol", downstream="package1")
+    graph.register_dependent(upstream="dol", downstream="package2")
+    graph.register_dependent(upstream="i2", downstream="package3")
+    graph.get_all_edges()  # creates the (hidden) edges log
+
+    assert len(graph) == 2
+
+
+def test_batch_defers_writes(tmp_path):
+    """Test that edges registered in a batch are written on exit."""
+    graph = DependencyGraph(store_path=str(tmp_path))
+
+    with graph.batch():
+        graph.register_dependent(upstream="dol", downstream="package1")
+        graph.register_dependent(upstream="dol", downstream="package2")
+        assert len(graph["dol"]) == 2
+        assert not (tmp_path / "dol.json").exists()
+
+    reloaded = DependencyGraph(store_path=str(tmp_path))
+    assert {e["downstream"] for e in reloaded["dol"]} == {"package1", "package2"}
+
+
+def test_same_size_rewrite_within_mtime_tick(graph):
+    """A rewrite isn't masked by the cache when mtime and size don't change."""
+    graph["dol"] = [{"upstream": "dol", "downstream": "pkg1"}]
+    path = graph.store_path / "dol.json"
+    stat = os.stat(path)
+    assert graph["dol"][0]["downstream"] == "pkg1"
+
+    graph["dol"] = [{"upstream": "dol", "downstream": "pkg2"}]
+    # As on a filesystem with coarse timestamps
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert graph["dol"][0]["downstream"] == "pkg2"
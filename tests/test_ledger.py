@@ -1,13 +1,21 @@
 """Tests for wary.ledger module."""
 
-import tempfile
 from datetime import datetime
+import threading
+import time
+
 import pytest
 
 from wary import ResultsLedger
 from wary.base import TestResult
 
 
+@pytest.fixture
+def ledger(tmp_path):
+    """A fresh ledger backed by a per-test directory."""
+    return ResultsLedger(store_path=str(tmp_path))
+
+
 def create_test_result(test_id="test-123", status="pass"):
     """Helper to create a test result."""
     return TestResult(
@@ -27,83 +35,234 @@ def create_test_result(test_id="test-123", status="pass"):
     )
 
 
-def test_add_and_retrieve_result():
+def test_add_and_retrieve_result(ledger):
     """Test adding and retrieving a test result."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        ledger = ResultsLedger(store_path=tmpdir)
+    result = create_test_result()
+    ledger.add_result(result)
 
-        result = create_test_result()
-        ledger.add_result(result)
+    # Retrieve it
+    retrieved = ledger[result["test_id"]]
+    assert retrieved["test_id"] == result["test_id"]
+    assert retrieved["status"] == "pass"
 
-        # Retrieve it
-        retrieved = ledger[result["test_id"]]
-        assert retrieved["test_id"] == result["test_id"]
-        assert retrieved["status"] == "pass"
 
-
-def test_query_results_by_upstream():
+def test_query_results_by_upstream(ledger):
     """Test querying results by upstream package."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        ledger = ResultsLedger(store_path=tmpdir)
-
-        result1 = create_test_result("test-1")
-        result2 = create_test_result("test-2")
+    result1 = create_test_result("test-1")
+    result2 = create_test_result("test-2")
 
-        ledger.add_result(result1)
-        ledger.add_result(result2)
+    ledger.add_result(result1)
+    ledger.add_result(result2)
 
-        results = ledger.query_results(upstream_package="dol")
-        assert len(results) == 2
+    results = ledger.query_results(upstream_package="dol")
+    assert len(results) == 2
 
 
-def test_query_results_by_status():
+def test_query_results_by_status(ledger):
     """Test querying results by status."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        ledger = ResultsLedger(store_path=tmpdir)
-
-        pass_result = create_test_result("test-pass", status="pass")
-        fail_result = create_test_result("test-fail", status="fail")
+    pass_result = create_test_result("test-pass", status="pass")
+    fail_result = create_test_result("test-fail", status="fail")
 
-        ledger.add_result(pass_result)
-        ledger.add_result(fail_result)
+    ledger.add_result(pass_result)
+    ledger.add_result(fail_result)
 
-        pass_results = ledger.query_results(status="pass")
-        assert len(pass_results) == 1
-        assert pass_results[0]["status"] == "pass"
+    pass_results = ledger.query_results(status="pass")
+    assert len(pass_results) == 1
+    assert pass_results[0]["status"] == "pass"
 
-        fail_results = ledger.query_results(status="fail")
-        assert len(fail_results) == 1
-        assert fail_results[0]["status"] == "fail"
+    fail_results = ledger.query_results(status="fail")
+    assert len(fail_results) == 1
+    assert fail_results[0]["status"] == "fail"
 
 
-def test_get_latest_result():
+def test_get_latest_result(ledger):
     """Test getting the latest result for a package pair."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        ledger = ResultsLedger(store_path=tmpdir)
+    result1 = create_test_result("test-1")
+    result2 = create_test_result("test-2")
 
-        result1 = create_test_result("test-1")
-        result2 = create_test_result("test-2")
+    ledger.add_result(result1)
+    ledger.add_result(result2)
 
-        ledger.add_result(result1)
-        ledger.add_result(result2)
-
-        latest = ledger.get_latest_result(
-            upstream_package="dol", downstream_package="my-package"
-        )
-        assert latest is not None
-        # Should be one of the results
-        assert latest["test_id"] in ["test-1", "test-2"]
+    latest = ledger.get_latest_result(
+        upstream_package="dol", downstream_package="my-package"
+    )
+    assert latest is not None
+    # Should be one of the results
+    assert latest["test_id"] in ["test-1", "test-2"]
 
 
-def test_ledger_persistence():
+def test_ledger_persistence(tmp_path):
     """Test that ledger data persists across instances."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        # Create first instance and add data
-        ledger1 = ResultsLedger(store_path=tmpdir)
-        result = create_test_result()
-        ledger1.add_result(result)
-
-        # Create second instance and verify data persists
-        ledger2 = ResultsLedger(store_path=tmpdir)
-        retrieved = ledger2[result["test_id"]]
-        assert retrieved["test_id"] == result["test_id"]
+    # Create first instance and add data
+    ledger1 = ResultsLedger(store_path=str(tmp_path))
+    result = create_test_result()
+    ledger1.add_result(result)
+
+    # Create second instance and verify data persists
+    ledger2 = ResultsLedger(store_path=str(tmp_path))
+    retrieved = ledger2[result["test_id"]]
+    assert retrieved["test_id"] == result["test_id"]
+
+
+def test_query_results_by_upstream_version(ledger):
+    """Test querying results by upstream version."""
+    old_result = create_test_result("test-old")
+    new_result = create_test_result("test-new")
+    new_result["upstream_version"] = "0.3.0"
+
+    ledger.add_result(old_result)
+    ledger.add_result(new_result)
+
+    results = ledger.query_results(upstream_package="dol", upstream_version="0.3.0")
+    assert len(results) == 1
+    assert results[0]["test_id"] == "test-new"
+
+
+def test_query_results_output_limit(ledger):
+    """Test truncating output when querying results."""
+    ledger.add_result(create_test_result())
+
+    results = ledger.query_results(output_limit=3)
+    assert results[0]["output"] == "All"
+
+
+def test_get_latest_result_uses_newest(tmp_path):
+    """Test that the latest result tracks started_at, not insertion order."""
+    ledger = ResultsLedger(store_path=str(tmp_path))
+
+    newer = create_test_result("test-newer")
+    older = create_test_result("test-older")
+    older["started_at"] = datetime(2020, 1, 1)
+
+    ledger.add_result(newer)
+    ledger.add_result(older)
+
+    latest = ledger.get_latest_result("dol", "my-package")
+    assert latest["test_id"] == "test-newer"
+
+    # The index persists across instances
+    assert ResultsLedger(store_path=str(tmp_path)).get_latest_result(
+        "dol", "my-package"
+    )["test_id"] == "test-newer"
+    assert len(ledger) == 2
+    assert ledger.get_latest_result("dol", "other") is None
+
+
+def test_has_results(ledger):
+    """Test checking for matching results."""
+    assert not ledger.has_results(status="fail")
+
+    ledger.add_result(create_test_result("test-fail", status="fail"))
+
+    assert ledger.has_results(status="fail")
+    assert not ledger.has_results(status="fail", upstream_version="9.9.9")
+    # Takes iter_results' non-filtering options too
+    assert ledger.has_results(status="fail", limit=10, output_limit=100)
+
+
+def test_query_results_after_delete(ledger):
+    """Test that deleted results are no longer returned."""
+    ledger.add_result(create_test_result("test-1"))
+    ledger.add_result(create_test_result("test-2"))
+    assert len(ledger.query_results()) == 2
+
+    del ledger["test-1"]
+    assert [r["test_id"] for r in ledger.query_results()] == ["test-2"]
+
+
+def test_query_results_after_overwrite(ledger):
+    """Test that an overwritten result is matched on its new values only."""
+    result = create_test_result("test-1", status="fail")
+    ledger.add_result(result)
+    assert len(ledger.query_results(status="fail")) == 1
+
+    result["status"] = "pass"
+    ledger.add_result(result)
+    assert ledger.query_results(status="fail") == []
+    assert len(ledger.query_results(status="pass")) == 1
+
+
+def test_query_results_after(ledger):
+    """Test filtering by start time, whichever way it was serialized."""
+    old = create_test_result(test_id="test-old")
+    old["started_at"] = "2024-01-01 09:00:00"
+    new = create_test_result(test_id="test-new")
+    new["started_at"] = datetime(2024, 1, 1, 11, 0)
+    ledger.add_result(old)
+    ledger.add_result(new)
+
+    results = ledger.query_results(after=datetime(2024, 1, 1, 10, 0))
+    assert [r["test_id"] for r in results] == ["test-new"]
+
+
+def test_status_counts(ledger):
+    """Test counting results by status."""
+    ledger.add_result(create_test_result(test_id="test-1", status="pass"))
+    ledger.add_result(create_test_result(test_id="test-2", status="fail"))
+    ledger.add_result(create_test_result(test_id="test-3", status="pass"))
+
+    counts = ledger.status_counts()
+    assert counts["pass"] == 2
+    assert counts["fail"] == 1
+    assert ledger.status_counts(upstream_package="other") == {}
+
+
+def test_data_version(ledger):
+    """Test that the data version changes when results are added."""
+    before = ledger.data_version()
+    ledger.add_result(create_test_result())
+    assert ledger.data_version() != before
+
+
+def test_result_added_during_log_rebuild(ledger, monkeypatch):
+    """A result written while the log is rebuilt isn't lost from queries."""
+    ledger.add_result(create_test_result("test-1"))
+    ledger._results_log_path.unlink(missing_ok=True)
+
+    writer = threading.Thread(
+        target=ledger.add_result, args=(create_test_result("test-2"),)
+    )
+    read_result = ResultsLedger._read_result
+
+    def slow_read_result(self, test_id):
+        # Once the rebuild has listed the results, write another one
+        if writer.ident is None:
+            writer.start()
+            time.sleep(0.1)
+        return read_result(self, test_id)
+
+    monkeypatch.setattr(ResultsLedger, "_read_result", slow_read_result)
+    ledger.status_counts()
+    writer.join()
+    monkeypatch.undo()
+
+    assert {r["test_id"] for r in ledger.query_results()} == {"test-1", "test-2"}
+
+
+def test_query_results_newest_first(ledger):
+    """Test that results come newest first, and that limit keeps the newest."""
+    for hour in (10, 12, 9, 11):
+        result = create_test_result(test_id=f"test-{hour}")
+        result["started_at"] = datetime(2024, 1, 1, hour, 0)
+        ledger.add_result(result)
+
+    results = ledger.query_results()
+    assert [r["test_id"] for r in results] == ["test-12", "test-11", "test-10", "test-9"]
+    results = ledger.query_results(limit=2)
+    assert [r["test_id"] for r in results] == ["test-12", "test-11"]
+
+
+def test_compressed_results(tmp_path):
+    """Test that large results are compressed, and both kinds are read back."""
+    plain = ResultsLedger(store_path=str(tmp_path))
+    plain.add_result(create_test_result(test_id="test-plain"))
+
+    ledger = ResultsLedger(store_path=str(tmp_path), compress=True)
+    result = create_test_result(test_id="test-big", status="fail")
+    result["output"] = "FAILED test_something\n" * 1000
+    ledger.add_result(result)
+
+    assert (tmp_path / "test-big.json").stat().st_size < len(result["output"]) // 10
+    assert ledger["test-big"]["output"] == result["output"]
+    assert ledger["test-plain"]["status"] == "pass"
+    assert [r["test_id"] for r in ledger.query_results(status="fail")] == ["test-big"]
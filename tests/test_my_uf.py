@@ -0,0 +1,45 @@
+"""Tests for wary.my_uf module."""
+
+from markupsafe import Markup
+
+from wary.my_uf import Page, PreformattedCard, make_badge, make_card, make_table
+
+SCRIPT = "<script>alert(1)</script>"
+ESCAPED = "&lt;script&gt;alert(1)&lt;/script&gt;"
+
+
+def test_badge_escapes_text_and_color():
+    """Badge text and (unknown) colors are escaped."""
+    html = make_badge(SCRIPT).to_html()
+    assert ESCAPED in html and SCRIPT not in html
+
+    html = make_badge("ok", color='"><script>').to_html()
+    assert "<script>" not in html
+
+
+def test_card_escapes_title_and_content():
+    """Card titles and text content are escaped, but Markup content is kept."""
+    html = make_card(SCRIPT, SCRIPT).to_html()
+    assert html.count(ESCAPED) == 2 and SCRIPT not in html
+
+    html = make_card("Info", Markup("<p>{}</p>").format(SCRIPT)).to_html()
+    assert f"<p>{ESCAPED}</p>" in html
+
+
+def test_table_escapes_cells():
+    """Table headers and cells are escaped."""
+    html = make_table([SCRIPT], [[SCRIPT]]).to_html()
+    assert html.count(ESCAPED) == 2 and SCRIPT not in html
+
+
+def test_preformatted_card_escapes_every_chunk(monkeypatch):
+    """PreformattedCard escapes its title, and its text across chunk boundaries."""
+    monkeypatch.setattr("wary.my_uf.PREFORMATTED_CHUNK_SIZE", 7)
+    html = "".join(PreformattedCard(SCRIPT, SCRIPT * 3).iter_html())
+    assert html.count(ESCAPED) == 4 and SCRIPT not in html
+
+
+def test_page_escapes_title():
+    """Page titles are escaped."""
+    html = Page(title=SCRIPT, components=[]).to_html()
+    assert SCRIPT not in html
@@ -0,0 +1,65 @@
+"""Tests for wary.orchestrator module."""
+
+import subprocess
+
+import pytest
+
+from wary import DependencyGraph, ResultsLedger, TestOrchestrator
+from wary import orchestrator as orchestrator_module
+
+
+@pytest.fixture
+def orchestrator(tmp_path, monkeypatch):
+    """An orchestrator whose subprocesses are faked, and time out for `sleep`."""
+
+    async def fake_run_subprocess(args, timeout=None, cwd=None, log_file=None):
+        if args[0] == "sleep":
+            raise subprocess.TimeoutExpired(args, timeout)
+        if log_file is not None:
+            log_file.write(b"1 passed\n")
+        return subprocess.CompletedProcess(args, 0, "", "")
+
+    monkeypatch.setattr(orchestrator_module, "_run_subprocess", fake_run_subprocess)
+    monkeypatch.setattr(TestOrchestrator, "_create_venv", lambda self, venv_path: None)
+    return TestOrchestrator(
+        results_ledger=ResultsLedger(store_path=str(tmp_path / "results")),
+        template_venv_dir=str(tmp_path / "venvs"),
+        log_dir=str(tmp_path / "logs"),
+    )
+
+
+def test_timed_out_dependent_keeps_other_results(orchestrator, tmp_path):
+    """A dependent whose tests time out fails, without losing the others' results."""
+    graph = DependencyGraph(store_path=str(tmp_path / "graphs"))
+    graph.register_dependent(upstream="dol", downstream="fast-pkg")
+    graph.register_dependent(upstream="dol", downstream="slow-pkg", test_command="sleep 1000")
+
+    results = orchestrator.test_all_dependents("dol", "0.2.51", graph)
+
+    statuses = {r["downstream_package"]: r["status"] for r in results}
+    assert statuses == {"fast-pkg": "pass", "slow-pkg": "fail"}
+    slow = next(r for r in results if r["downstream_package"] == "slow-pkg")
+    assert "Timed out" in slow["output"]
+    assert len(orchestrator.results_ledger) == 2
+
+
+def test_raising_dependent_keeps_other_results(orchestrator, tmp_path, monkeypatch):
+    """A dependent whose test raises gets an error result; the others are recorded."""
+    graph = DependencyGraph(store_path=str(tmp_path / "graphs"))
+    graph.register_dependent(upstream="dol", downstream="ok-pkg")
+    graph.register_dependent(upstream="dol", downstream="boom-pkg")
+    arun_test = TestOrchestrator.arun_test
+
+    async def flaky_arun_test(self, downstream_package, **kwargs):
+        if downstream_package == "boom-pkg":
+            raise FileNotFoundError("no such test command")
+        return await arun_test(self, downstream_package=downstream_package, **kwargs)
+
+    monkeypatch.setattr(TestOrchestrator, "arun_test", flaky_arun_test)
+
+    results = orchestrator.test_all_dependents("dol", "0.2.51", graph)
+
+    statuses = {r["downstream_package"]: r["status"] for r in results}
+    assert statuses == {"ok-pkg": "pass", "boom-pkg": "error"}
+    assert "no such test command" in results[1]["output"]
+    assert [r["downstream_package"] for r in orchestrator.results_ledger.values()] == ["ok-pkg"]
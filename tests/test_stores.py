@@ -0,0 +1,145 @@
+"""Tests for wary.stores backends (SQLite, and PostgreSQL parts needing no server)."""
+
+from datetime import datetime
+import sqlite3
+
+import pytest
+
+from wary.stores import SQLiteDependencyGraph, SQLiteResultsLedger
+from tests.test_ledger import create_test_result
+
+
+@pytest.fixture
+def graph(tmp_path):
+    return SQLiteDependencyGraph(db_path=str(tmp_path / "wary.db"))
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return SQLiteResultsLedger(db_path=str(tmp_path / "wary.db"))
+
+
+def test_graph_register_and_update(graph):
+    """Test registering, updating and listing dependents."""
+    graph.register_dependent(upstream="dol", downstream="package1", constraint=">=0.2")
+    graph.register_dependent(upstream="dol", downstream="package2")
+    graph.register_dependent(upstream="dol", downstream="package1", constraint=">=0.3")
+
+    dependents = graph.get_dependents("dol")
+    assert [d["downstream"] for d in dependents] == ["package2", "package1"]
+    assert dependents[1]["constraint"] == ">=0.3"
+    assert dependents[1]["metadata"]["test_command"] == "pytest"
+    assert list(graph) == ["dol"]
+    assert len(graph.get_all_edges()) == 2
+    assert graph.dependent_counts() == {"dol": 2}
+
+
+def test_graph_failed_update_keeps_edge(graph):
+    """An update whose insert fails leaves the previous edge in place."""
+    graph.register_dependent(upstream="dol", downstream="package1", constraint=">=0.2")
+    graph.conn.execute("""
+        CREATE TRIGGER reject_bad BEFORE INSERT ON dependency_edges
+        WHEN NEW.constraint_spec = 'bad'
+        BEGIN SELECT RAISE(ABORT, 'rejected'); END
+    """)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        graph.register_dependent(upstream="dol", downstream="package1", constraint="bad")
+
+    assert [d["constraint"] for d in graph.get_dependents("dol")] == [">=0.2"]
+
+
+def test_graph_batch(graph):
+    """Test that a batch commits its writes together."""
+    with graph.batch():
+        graph.register_dependent(upstream="dol", downstream="package1")
+        graph["i2"] = [{"upstream": "i2", "downstream": "package2"}]
+
+    assert len(graph) == 2
+    del graph["i2"]
+    assert graph["i2"] == []
+
+
+def test_ledger_query(ledger):
+    """Test storing and querying results."""
+    old = create_test_result(test_id="test-old", status="fail")
+    old["started_at"] = datetime(2024, 1, 1, 9, 0)
+    new = create_test_result(test_id="test-new")
+    new["started_at"] = datetime(2024, 1, 1, 11, 0)
+    ledger.add_result(old)
+    ledger.add_result(new)
+
+    assert ledger["test-old"]["status"] == "fail"
+    assert [r["test_id"] for r in ledger.query_results()] == ["test-new", "test-old"]
+    assert [r["test_id"] for r in ledger.query_results(status="fail")] == ["test-old"]
+    assert [
+        r["test_id"] for r in ledger.query_results(after=datetime(2024, 1, 1, 10, 0))
+    ] == ["test-new"]
+    assert ledger.query_results(output_limit=3)[0]["output"] == "All"
+    assert [r["test_id"] for r in ledger.query_results(limit=1)] == ["test-new"]
+    assert ledger.status_counts(upstream_package="dol") == {"pass": 1, "fail": 1}
+    version = ledger.data_version()
+    del ledger["test-old"]
+    assert ledger.data_version() != version
+    assert ledger.has_results(upstream_version="0.2.51")
+    assert not ledger.has_results(status="error")
+    assert ledger.has_results(upstream_version="0.2.51", limit=10, output_limit=100)
+    assert ledger.get_latest_result("dol", "my-package")["test_id"] == "test-new"
+
+
+def test_ledger_add_results_bulk(ledger):
+    """Test adding several results in one transaction."""
+    ledger.add_results_bulk(
+        [create_test_result(test_id=f"test-{i}") for i in range(3)]
+    )
+    assert len(ledger) == 3
+
+
+def test_postgres_cursor_closes_broken_connection():
+    """A connection whose cleanup fails is closed, and the original error raised."""
+    psycopg2 = pytest.importorskip("psycopg2")
+    from contextlib import nullcontext
+    from wary.stores import PostgresResultsLedger
+
+    class DeadConnection:
+        prepared = {"wary_add_result"}
+
+        def cursor(self, cursor_factory=None):
+            return nullcontext(object())
+
+        def rollback(self):
+            raise psycopg2.OperationalError("server closed the connection")
+
+    class Pool:
+        def getconn(self):
+            return DeadConnection()
+
+        def putconn(self, conn, close=False):
+            self.closed = close
+
+    ledger = PostgresResultsLedger.__new__(PostgresResultsLedger)
+    ledger.pool = Pool()
+    with pytest.raises(ValueError, match="original"):
+        with ledger._cursor():
+            raise ValueError("original")
+    assert ledger.pool.closed
+
+
+@pytest.mark.parametrize("store_type", [SQLiteResultsLedger, SQLiteDependencyGraph])
+def test_data_version_is_shared_across_connections(tmp_path, store_type):
+    """Connections (e.g. of different workers) agree on the data version."""
+    db_path = str(tmp_path / "wary.db")
+    a, b = store_type(db_path), store_type(db_path)
+    assert a.data_version() == b.data_version()
+
+    versions = {a.data_version()}
+    for store in (a, b, a):
+        if store_type is SQLiteResultsLedger:
+            store.add_result(create_test_result(f"test-{len(versions)}"))
+        else:
+            store.register_dependent(upstream="dol", downstream=f"pkg{len(versions)}")
+        assert a.data_version() == b.data_version()
+        versions.add(a.data_version())
+
+    assert len(versions) == 4
+    assert store_type(str(tmp_path / "other.db")).data_version() not in versions
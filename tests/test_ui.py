@@ -0,0 +1,75 @@
+"""Tests for wary.ui module."""
+
+import pytest
+
+from wary import DependencyGraph, ResultsLedger, api, ui
+from tests.test_api import sqlite_backend  # noqa: F401 (fixture)
+from tests.test_ledger import create_test_result
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def stores(request, tmp_path, monkeypatch):
+    """The UI's graph and ledger, on the file or the SQLite backend."""
+    if request.param == "sqlite":
+        request.getfixturevalue("sqlite_backend")
+        return api.get_graph(), api.get_ledger()
+
+    graph = DependencyGraph(store_path=str(tmp_path / "graphs"))
+    ledger = ResultsLedger(store_path=str(tmp_path / "results"))
+    monkeypatch.setattr(ui, "get_graph", lambda: graph)
+    monkeypatch.setattr(ui, "get_ledger", lambda: ledger)
+    return graph, ledger
+
+
+@pytest.fixture
+def client(stores):
+    return ui.create_ui_app().test_client()
+
+
+@pytest.mark.parametrize("path", ["/", "/package/dol", "/results"])
+def test_etag_changes_when_a_result_is_written(client, stores, path):
+    """A page's ETag stops matching once a result is written."""
+    _, ledger = stores
+    etag = client.get(path).headers["ETag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    ledger.add_result(create_test_result("test-1", status="fail"))
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert b"my-package" in response.data
+
+
+def test_etag_changes_when_a_dependent_is_registered(client, stores):
+    """A page's ETag stops matching once the graph changes."""
+    graph, _ = stores
+    etag = client.get("/").headers["ETag"]
+
+    graph.register_dependent(upstream="dol", downstream="my-package")
+
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_pages_escape_result_fields(client, stores):
+    """Package names, statuses and test output can't inject markup into pages."""
+    graph, ledger = stores
+    script = "<script>alert(1)</script>"
+    escaped = "&lt;script&gt;alert(1)&lt;/script&gt;"
+    result = create_test_result("test-xss", status="fail")
+    result.update(downstream_package=script, test_command=script, output=script)
+    ledger.add_result(result)
+    ledger.add_result(create_test_result("test-xss-status", status=script))
+    graph.register_dependent(upstream="dol", downstream=script)
+
+    for path in ["/", "/package/dol", "/results", "/result/test-xss"]:
+        html = client.get(path).get_data(as_text=True)
+        assert script not in html, path
+        assert escaped in html, path
+
+    # Unknown statuses are shown upper-cased
+    html = client.get("/result/test-xss-status").get_data(as_text=True)
+    assert script.upper() not in html
+    assert "&lt;SCRIPT&gt;ALERT(1)&lt;/SCRIPT&gt;" in html
@@ -61,3 +61,53 @@ def test_check_for_updates_with_change():
         old_ver, new_ver = updates["requests"]
         assert old_ver == "0.0.1"
         assert new_ver is not None
+
+
+def test_latest_version_cache(tmp_path, monkeypatch):
+    """Test that latest versions are served from memory within the TTL."""
+    watcher = VersionWatcher(store_path=str(tmp_path), cache_ttl=300)
+    calls = []
+
+    def fake_fetch(package):
+        calls.append(package)
+        return "1.0.0"
+
+    monkeypatch.setattr(watcher, "_fetch_latest_version", fake_fetch)
+
+    assert watcher.get_latest_version("dol") == "1.0.0"
+    assert watcher.get_latest_version("dol") == "1.0.0"
+    assert calls == ["dol"]
+
+
+def test_latest_version_conditional_request(tmp_path, monkeypatch):
+    """Test that a known package is re-fetched conditionally, on its ETag."""
+    watcher = VersionWatcher(store_path=str(tmp_path))
+    sent_headers = []
+
+    class FakeResponse:
+        content = b'{"info": {"version": "1.0.0"}}'
+
+        def __init__(self, status_code):
+            self.status_code = status_code
+            self.headers = {"ETag": '"v1"'}
+
+        def raise_for_status(self):
+            pass
+
+    class FakeSession:
+        def get(self, url, headers=None, timeout=None):
+            sent_headers.append(headers)
+            return FakeResponse(304 if headers else 200)
+
+    monkeypatch.setattr("wary.watcher.http_session", lambda: FakeSession())
+
+    assert watcher.get_latest_version("dol") == "1.0.0"
+    assert watcher.get_latest_version("dol") == "1.0.0"
+    assert sent_headers == [None, {"If-None-Match": '"v1"'}]
+
+
+def test_watchers_share_store(tmp_path):
+    """Watchers on the same directory reuse one store instance."""
+    a = VersionWatcher(store_path=str(tmp_path))
+    b = VersionWatcher(store_path=tmp_path)
+    assert a._store is b._store
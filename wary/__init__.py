@@ -9,6 +9,9 @@ Phases:
 - Phase 3: Community Tool (API + Web UI)
 """
 
+from importlib import import_module
+from importlib.util import find_spec
+
 from wary.base import PackageVersion, DependencyEdge, TestResult
 from wary.graph import DependencyGraph, build_graph_from_librariesio, build_graph_from_pipdeptree
 from wary.watcher import VersionWatcher
@@ -38,20 +41,47 @@ __all__ = [
     "format_test_result",
 ]
 
-# Optional imports for Phase 3 (API/UI)
-try:
-    from wary.api import create_app as create_api_app
-    from wary.ui import create_ui_app
-    from wary.server import create_combined_app, run_server
-    __all__.extend(["create_api_app", "create_ui_app", "create_combined_app", "run_server"])
-except ImportError:
+# Optional exports for Phase 3 (API/UI), imported on first access (Flask is
+# slow to import, and the CLI doesn't need it)
+_LAZY_EXPORTS = {
+    "create_api_app": ("wary.api", "create_app"),
+    "create_ui_app": ("wary.ui", "create_ui_app"),
+    "create_combined_app": ("wary.server", "create_combined_app"),
+    "run_server": ("wary.server", "run_server"),
+}
+
+if find_spec("flask") is not None:
+    __all__.extend(_LAZY_EXPORTS)
+else:
     # Flask not installed, API/UI not available
-    pass
+    _LAZY_EXPORTS = {}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        module_name, attr = _LAZY_EXPORTS[name]
+        value = getattr(import_module(module_name), attr)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module 'wary' has no attribute {name!r}")
+
 
 # Optional imports for PostgreSQL storage
 try:
-    from wary.stores import PostgresDependencyGraph, PostgresResultsLedger
-    __all__.extend(["PostgresDependencyGraph", "PostgresResultsLedger"])
+    from wary.stores import (
+        PostgresDependencyGraph,
+        PostgresResultsLedger,
+        SQLiteDependencyGraph,
+        SQLiteResultsLedger,
+    )
+    __all__.extend(
+        [
+            "PostgresDependencyGraph",
+            "PostgresResultsLedger",
+            "SQLiteDependencyGraph",
+            "SQLiteResultsLedger",
+        ]
+    )
 except ImportError:
     # psycopg2 not installed
     pass
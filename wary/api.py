@@ -5,7 +5,9 @@ It allows remote registration of dependents, triggering tests, and querying resu
 """
 
 from flask import Flask, request, jsonify
-from functools import wraps
+from collections import Counter
+from functools import lru_cache, wraps
+import hmac
 import os
 
 from wary.graph import DependencyGraph
@@ -14,42 +16,60 @@ from wary.orchestrator import TestOrchestrator
 from wary.ledger import ResultsLedger
 
 
-# Shared instances (can be configured to use PostgreSQL)
+# Shared instances (can be configured to use PostgreSQL), created once per process
+def _use_sqlite() -> bool:
+    """Whether WARY_BACKEND selects the SQLite stores (at WARY_SQLITE_PATH, if set)."""
+    return os.environ.get('WARY_BACKEND', '').lower() == 'sqlite'
+
+
+@lru_cache(maxsize=1)
 def get_graph():
     """Get dependency graph instance."""
     # Could be configured to use PostgreSQL via env var
+    if _use_sqlite():
+        from wary.stores import SQLiteDependencyGraph
+
+        return SQLiteDependencyGraph(os.environ.get('WARY_SQLITE_PATH'))
     return DependencyGraph()
 
 
+@lru_cache(maxsize=1)
 def get_orchestrator():
-    """Get test orchestrator instance."""
-    return TestOrchestrator()
+    """Get test orchestrator instance, recording to the `get_ledger` ledger."""
+    return TestOrchestrator(results_ledger=get_ledger())
 
 
+@lru_cache(maxsize=1)
 def get_ledger():
     """Get results ledger instance."""
+    if _use_sqlite():
+        from wary.stores import SQLiteResultsLedger
+
+        return SQLiteResultsLedger(os.environ.get('WARY_SQLITE_PATH'))
     return ResultsLedger()
 
 
+@lru_cache(maxsize=1)
 def get_watcher():
     """Get version watcher instance."""
-    return VersionWatcher()
+    # PyPI versions change rarely; serve repeat lookups from memory for a while
+    return VersionWatcher(cache_ttl=300)
 
 
 # Simple auth decorator
 def require_api_key(f):
     """Require API key for protected endpoints."""
 
+    # In production, validate against database
+    # For now, check against environment variable (read when the app is created)
+    expected_key = os.environ.get('WARY_API_KEY', '')
+    if not expected_key:
+        return f
+
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        api_key = request.headers.get('Authorization', '')
-        if api_key.startswith('Bearer '):
-            api_key = api_key[7:]
-
-        # In production, validate against database
-        # For now, check against environment variable
-        expected_key = os.environ.get('WARY_API_KEY', '')
-        if expected_key and api_key != expected_key:
+        api_key = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(api_key.encode(), expected_key.encode()):
             return jsonify({'error': 'Invalid API key'}), 401
 
         return f(*args, **kwargs)
@@ -91,6 +111,7 @@ def create_app(config=None):
                     'GET /api': 'API information',
                     'GET /api/dependents/<upstream>': 'Get dependents of a package',
                     'POST /api/dependents': 'Register a new dependent',
+                    'POST /api/dependents/bulk': 'Register a dependent of several upstreams',
                     'POST /api/test': 'Test all dependents',
                     'GET /api/results': 'Query test results',
                     'GET /api/results/<test_id>': 'Get specific test result',
@@ -116,7 +137,7 @@ def create_app(config=None):
     def register_dependent():
         """Register a new dependent package."""
         try:
-            data = request.get_json()
+            data = request.get_json(silent=True)
 
             if not data:
                 return jsonify({'error': 'No data provided'}), 400
@@ -141,13 +162,43 @@ def create_app(config=None):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/dependents/bulk', methods=['POST'])
+    @require_api_key
+    def register_dependent_bulk():
+        """Register a dependent package against several upstreams at once."""
+        try:
+            data = request.get_json(silent=True)
+
+            if not data:
+                return jsonify({'error': 'No data provided'}), 400
+
+            upstreams = data.get('upstreams')
+            downstream = data.get('downstream')
+
+            if not upstreams or not downstream:
+                return jsonify({'error': 'upstreams and downstream are required'}), 400
+
+            details = dict(
+                constraint=data.get('constraint', ''),
+                test_command=data.get('test_command', 'pytest'),
+                contact=data.get('contact', ''),
+                repo_url=data.get('repo_url', ''),
+            )
+            graph = get_graph()
+            for upstream in upstreams:
+                graph.register_dependent(upstream=upstream, downstream=downstream, **details)
+
+            return jsonify({'status': 'registered', 'upstreams': upstreams, 'downstream': downstream}), 201
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
     # Test endpoint
     @app.route('/api/test', methods=['POST'])
     @require_api_key
     def trigger_test():
         """Test all dependents of a package at a specific version."""
         try:
-            data = request.get_json()
+            data = request.get_json(silent=True)
 
             if not data:
                 return jsonify({'error': 'No data provided'}), 400
@@ -164,16 +215,23 @@ def create_app(config=None):
             # This could be async/background job in production
             results = orchestrator.test_all_dependents(upstream, version, graph)
 
+            # One pass for both the status counts and the per-result rows
+            status_counts = Counter()
+            rows = []
+            for r in results:
+                status = r['status']
+                status_counts[status] += 1
+                rows.append(
+                    {'downstream': r['downstream_package'], 'status': status, 'test_id': r['test_id']}
+                )
+
             summary = {
                 'upstream': upstream,
                 'version': version,
                 'total': len(results),
-                'passed': sum(1 for r in results if r['status'] == 'pass'),
-                'failed': sum(1 for r in results if r['status'] == 'fail'),
-                'results': [
-                    {'downstream': r['downstream_package'], 'status': r['status'], 'test_id': r['test_id']}
-                    for r in results
-                ],
+                'passed': status_counts['pass'],
+                'failed': status_counts['fail'],
+                'results': rows,
             }
 
             return jsonify(summary)
@@ -188,18 +246,20 @@ def create_app(config=None):
             ledger = get_ledger()
 
             # Get query parameters
-            upstream = request.args.get('upstream')
-            downstream = request.args.get('downstream')
-            status = request.args.get('status')
-            limit = int(request.args.get('limit', 100))
+            args = request.args
+            upstream = args.get('upstream')
+            downstream = args.get('downstream')
+            status = args.get('status')
+            limit = int(args.get('limit', 100))
 
+            # Only load the results that will be returned (the newest ones)
             results = ledger.query_results(
-                upstream_package=upstream, downstream_package=downstream, status=status
+                upstream_package=upstream,
+                downstream_package=downstream,
+                status=status,
+                limit=limit,
             )
 
-            # Limit results
-            results = results[:limit]
-
             return jsonify({'count': len(results), 'results': results})
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -235,7 +295,7 @@ def create_app(config=None):
     def add_watch():
         """Add a package to the watch list."""
         try:
-            data = request.get_json()
+            data = request.get_json(silent=True)
 
             if not data:
                 return jsonify({'error': 'No data provided'}), 400
@@ -260,19 +320,25 @@ def create_app(config=None):
             ledger = get_ledger()
 
             all_edges = graph.get_all_edges()
-            all_results = list(ledger.query_results())
+            upstreams, downstreams = set(), set()
+            for e in all_edges:
+                upstreams.add(e['upstream'])
+                downstreams.add(e['downstream'])
+
+            status_counts = ledger.status_counts()
+            total_tests = sum(status_counts.values())
 
             stats = {
                 'total_edges': len(all_edges),
-                'total_tests': len(all_results),
-                'unique_upstream': len(set(e['upstream'] for e in all_edges)),
-                'unique_downstream': len(set(e['downstream'] for e in all_edges)),
+                'total_tests': total_tests,
+                'unique_upstream': len(upstreams),
+                'unique_downstream': len(downstreams),
             }
 
-            if all_results:
-                stats['passed'] = sum(1 for r in all_results if r['status'] == 'pass')
-                stats['failed'] = sum(1 for r in all_results if r['status'] == 'fail')
-                stats['pass_rate'] = stats['passed'] / len(all_results) * 100
+            if total_tests:
+                stats['passed'] = status_counts['pass']
+                stats['failed'] = status_counts['fail']
+                stats['pass_rate'] = stats['passed'] / total_tests * 100
 
             return jsonify(stats)
         except Exception as e:
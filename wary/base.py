@@ -1,4 +1,9 @@
-"""Core data structures for wary dependency monitoring."""
+"""Core data structures for wary dependency monitoring.
+
+These are ``TypedDict``s, i.e. plain dicts at runtime: records are stored and
+served as JSON (files, Postgres rows, API responses), so keeping them as dicts
+avoids a conversion at every boundary.
+"""
 
 from typing import TypedDict, Literal
 from datetime import datetime
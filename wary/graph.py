@@ -1,34 +1,96 @@
 """Dependency graph management for wary."""
 
 from typing import Iterator
+from collections import Counter
 from collections.abc import MutableMapping
+from contextlib import contextmanager
 from pathlib import Path
-import json
+import asyncio
+import os
 from datetime import datetime
 
 from wary.base import DependencyEdge
+from wary.util import (
+    COMPRESS_MIN_BYTES,
+    append_jsonl,
+    compress_bytes,
+    decompress_bytes,
+    file_lock,
+    file_version,
+    json_dumps,
+    json_file_stems,
+    json_loads,
+    read_jsonl,
+    write_jsonl,
+)
+
+# Hidden, so it isn't listed as an upstream package
+EDGES_LOG_FILENAME = ".edges.jsonl"
+
+
+# Parsed edges files: {path: ((mtime_ns, size), edges)}
+EDGES_CACHE_MAXSIZE = 1024
+_edges_cache: dict[str, tuple[tuple[int, int], list[DependencyEdge]]] = {}
+
+
+def _load_edges(path: str) -> list[DependencyEdge]:
+    """Parse an edges file, or reuse its last parse if it hasn't changed since.
+
+    Other processes' writes are noticed by their mtime and size. mtime
+    resolution can be coarse, so this process's own writes also evict the
+    file's entry (see `_forget_edges`).
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _edges_cache.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with open(path, "rb") as f:
+        edges = json_loads(decompress_bytes(f.read()))
+    if len(_edges_cache) >= EDGES_CACHE_MAXSIZE:
+        _edges_cache.clear()
+    _edges_cache[path] = (version, edges)
+    return edges
+
+
+def _forget_edges(path: str):
+    _edges_cache.pop(path, None)
 
 
 class DependencyGraph(MutableMapping):
     """Store dependency edges with upstream package as key.
 
-    Uses dol for storage abstraction - can back with JSON files,
-    SQLite, or remote storage.
+    Backed by one JSON file per upstream package (see `wary.stores` for
+    SQLite and PostgreSQL backends).
 
     Key: upstream_package_name (str)
     Value: List of DependencyEdge dicts
+
+    Every write is also appended to an ``{upstream, edges}`` log so bulk reads
+    (`get_all_edges`) scan one file instead of every package's file. The
+    per-package files remain the source of truth: the log is rebuilt from them
+    when missing or when superseded records make it too long.
+
+    Inside a `batch` block, `register_dependent` keeps edges in memory and
+    each touched upstream is written once, on `flush` (or leaving the block).
+    Pending edges are visible through ``graph[upstream]`` meanwhile, but not
+    through iteration or `get_all_edges`.
+
+    With ``compress=True``, files of at least ``COMPRESS_MIN_BYTES`` are written
+    compressed (zstd if installed, else gzip). Either kind is read back.
     """
 
-    def __init__(self, store_path: str = None):
+    def __init__(self, store_path: str = None, compress: bool = False):
         if store_path is None:
             store_path = self._default_store_path()
         self.store_path = Path(store_path)
         self.store_path.mkdir(parents=True, exist_ok=True)
+        self.compress = compress
 
-        # Use dol to wrap filesystem as dict
-        from dol import Files
-
-        self._store = Files(str(self.store_path))
+        self._edges_log_path = self.store_path / EDGES_LOG_FILENAME
+        # Deferred edges of each upstream, keyed by downstream
+        self._dirty: dict[str, dict[str, DependencyEdge]] = {}
+        self._batching = False
 
     def _default_store_path(self) -> Path:
         import appdirs
@@ -37,29 +99,50 @@ class DependencyGraph(MutableMapping):
 
     def __getitem__(self, upstream_pkg: str) -> list[DependencyEdge]:
         """Get all edges for an upstream package."""
+        if upstream_pkg in self._dirty:
+            return list(self._dirty[upstream_pkg].values())
         try:
-            # Files stores bytes, so decode
-            data_bytes = self._store[f"{upstream_pkg}.json"]
-            data = json.loads(data_bytes.decode('utf-8'))
-            return data
-        except KeyError:
+            edges = _load_edges(str(self.store_path / f"{upstream_pkg}.json"))
+        except FileNotFoundError:
             return []
+        # Copy so callers can't mutate the cached list
+        return list(edges)
 
     def __setitem__(self, upstream_pkg: str, edges: list[DependencyEdge]):
         """Set edges for an upstream package."""
-        # Files stores bytes, so encode
-        data_str = json.dumps(edges, default=str)
-        self._store[f"{upstream_pkg}.json"] = data_str.encode('utf-8')
+        data = json_dumps(edges)
+        if self.compress and len(data) >= COMPRESS_MIN_BYTES:
+            data = compress_bytes(data)
+        path = self.store_path / f"{upstream_pkg}.json"
+        path.write_bytes(data)
+        # mtime resolution is coarse, so a rewrite may not change the cached version
+        _forget_edges(str(path))
+        append_jsonl(self._edges_log_path, {"upstream": upstream_pkg, "edges": edges})
 
     def __delitem__(self, upstream_pkg: str):
-        del self._store[f"{upstream_pkg}.json"]
+        self._dirty.pop(upstream_pkg, None)
+        path = self.store_path / f"{upstream_pkg}.json"
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            raise KeyError(upstream_pkg)
+        _forget_edges(str(path))
+        append_jsonl(self._edges_log_path, {"upstream": upstream_pkg, "edges": None})
 
     def __iter__(self) -> Iterator[str]:
-        for key in self._store:
-            yield key.replace(".json", "")
+        return json_file_stems(self.store_path)
 
     def __len__(self) -> int:
-        return len(list(self._store))
+        return sum(1 for _ in json_file_stems(self.store_path))
+
+    def data_version(self) -> tuple:
+        """A token that changes whenever edges change (a stat of the edges log)."""
+        version = file_version(self._edges_log_path)
+        if version == (0, 0):
+            # Writes only append to an existing log, so build it to track them
+            self._rebuild_edges_log()
+            version = file_version(self._edges_log_path)
+        return version
 
     def register_dependent(
         self,
@@ -71,8 +154,6 @@ class DependencyGraph(MutableMapping):
         **metadata,
     ):
         """Register a new dependent package."""
-        edges = self[upstream]
-
         # Update if exists, else append
         edge_dict = {
             "upstream": upstream,
@@ -83,11 +164,34 @@ class DependencyGraph(MutableMapping):
             "metadata": {"test_command": test_command, "contact": contact, **metadata},
         }
 
-        # Remove existing edge if present
-        edges = [e for e in edges if e["downstream"] != downstream]
-        edges.append(edge_dict)
+        if self._batching and upstream in self._dirty:
+            edges = self._dirty[upstream]
+        else:
+            edges = {e["downstream"]: e for e in self[upstream]}
+        # Remove existing edge if present, so the update moves to the end
+        edges.pop(downstream, None)
+        edges[downstream] = edge_dict
+
+        if self._batching:
+            self._dirty[upstream] = edges
+        else:
+            self[upstream] = list(edges.values())
+
+    @contextmanager
+    def batch(self):
+        """Defer `register_dependent` writes until the block exits."""
+        self._batching = True
+        try:
+            yield self
+        finally:
+            self._batching = False
+            self.flush()
 
-        self[upstream] = edges
+    def flush(self):
+        """Write edges deferred by `batch` to the store."""
+        while self._dirty:
+            upstream, edges = self._dirty.popitem()
+            self[upstream] = list(edges.values())
 
     def get_dependents(self, upstream: str) -> list[DependencyEdge]:
         """Get all packages that depend on upstream."""
@@ -96,47 +200,117 @@ class DependencyGraph(MutableMapping):
     def get_all_edges(self) -> list[DependencyEdge]:
         """Flatten all edges."""
         all_edges = []
-        for upstream in self:
-            all_edges.extend(self[upstream])
+        for edges in self._edges_by_upstream().values():
+            all_edges.extend(edges)
         return all_edges
 
+    def dependent_counts(self) -> Counter:
+        """Count dependents per upstream package (e.g. ``.most_common(10)``)."""
+        return Counter(
+            {upstream: len(edges) for upstream, edges in self._edges_by_upstream().items()}
+        )
+
+    def _edges_by_upstream(self) -> dict[str, list[DependencyEdge]]:
+        """Replay the edges log (last record per upstream wins)."""
+        try:
+            records = read_jsonl(self._edges_log_path)
+        except FileNotFoundError:
+            return self._rebuild_edges_log()
+
+        edges_by_upstream = {}
+        for record in records:
+            edges_by_upstream[record["upstream"]] = record["edges"]
+        edges_by_upstream = {
+            upstream: edges
+            for upstream, edges in edges_by_upstream.items()
+            if edges is not None
+        }
+
+        if len(records) > 2 * len(edges_by_upstream) + 100:
+            return self._rebuild_edges_log()
+        return edges_by_upstream
+
+    def _rebuild_edges_log(self) -> dict[str, list[DependencyEdge]]:
+        # Locked, so edges written meanwhile are appended to the new log
+        with file_lock(self._edges_log_path):
+            edges_by_upstream = {upstream: self[upstream] for upstream in self}
+            write_jsonl(
+                self._edges_log_path,
+                (
+                    {"upstream": upstream, "edges": edges}
+                    for upstream, edges in edges_by_upstream.items()
+                ),
+            )
+        return edges_by_upstream
+
 
 def build_graph_from_librariesio(
-    package_name: str, api_key: str, depth: int = 1
+    package_name: str, api_key: str, depth: int = 1, max_concurrent: int = 16
 ) -> DependencyGraph:
     """Build dependency graph using Libraries.io API.
 
+    Crawls breadth-first, fetching each level's packages concurrently (at most
+    ``max_concurrent`` requests in flight).
+
     Docs: https://libraries.io/api
     """
+    return asyncio.run(
+        _abuild_graph_from_librariesio(package_name, api_key, depth, max_concurrent)
+    )
+
+
+async def _abuild_graph_from_librariesio(
+    package_name: str, api_key: str, depth: int, max_concurrent: int
+) -> DependencyGraph:
     import requests
 
     graph = DependencyGraph()
+    session = requests.Session()
+    sem = asyncio.Semaphore(max_concurrent)
 
-    def fetch_dependents(pkg: str, current_depth: int):
-        if current_depth > depth:
-            return
-
+    def fetch_dependents(pkg: str) -> list[dict]:
         url = f"https://libraries.io/api/pypi/{pkg}/dependents"
         params = {"api_key": api_key, "per_page": 100}
 
-        response = requests.get(url, params=params)
+        response = session.get(url, params=params)
         if response.status_code != 200:
-            return
-
-        dependents = response.json()
-        for dep in dependents:
-            downstream_name = dep.get("name")
-            constraint = dep.get("requirements", "")
+            return []
+        return response.json()
 
-            graph.register_dependent(
-                upstream=pkg, downstream=downstream_name, constraint=constraint, source="librariesio"
-            )
+    async def bounded_fetch(pkg: str) -> list[dict]:
+        async with sem:
+            return await asyncio.to_thread(fetch_dependents, pkg)
 
-            # Recurse
-            if current_depth < depth:
-                fetch_dependents(downstream_name, current_depth + 1)
+    with graph.batch():
+        try:
+            seen = {package_name}
+            level = [package_name]
+            for current_depth in range(depth + 1):
+                dependents_per_pkg = await asyncio.gather(*map(bounded_fetch, level))
+
+                next_level = []
+                for pkg, dependents in zip(level, dependents_per_pkg):
+                    for dep in dependents:
+                        downstream_name = dep.get("name")
+                        constraint = dep.get("requirements", "")
+
+                        graph.register_dependent(
+                            upstream=pkg,
+                            downstream=downstream_name,
+                            constraint=constraint,
+                            source="librariesio",
+                        )
+
+                        if downstream_name not in seen:
+                            seen.add(downstream_name)
+                            next_level.append(downstream_name)
+
+                if current_depth == depth or not next_level:
+                    break
+                level = next_level
+        finally:
+            session.close()
 
-    fetch_dependents(package_name, 0)
     return graph
 
 
@@ -160,15 +334,19 @@ def build_graph_from_pipdeptree(packages: list[str] = None) -> DependencyGraph:
     graph = DependencyGraph()
 
     # Invert: each package's dependencies become edges
-    for pkg_info in tree:
-        downstream = pkg_info["package"]["key"]
-
-        for dep in pkg_info.get("dependencies", []):
-            upstream = dep["key"]
-            constraint = dep.get("required_version", "")
-
-            graph.register_dependent(
-                upstream=upstream, downstream=downstream, constraint=constraint, source="local"
-            )
+    with graph.batch():
+        for pkg_info in tree:
+            downstream = pkg_info["package"]["key"]
+
+            for dep in pkg_info.get("dependencies", []):
+                upstream = dep["key"]
+                constraint = dep.get("required_version", "")
+
+                graph.register_dependent(
+                    upstream=upstream,
+                    downstream=downstream,
+                    constraint=constraint,
+                    source="local",
+                )
 
     return graph
@@ -1,92 +1,391 @@
 """Test results ledger for wary."""
 
-from collections.abc import MutableMapping
+from collections import Counter
+from collections.abc import Iterator, MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-import json
+import heapq
+import os
+import re
+import threading
 
 from wary.base import TestResult
+from wary.util import (
+    COMPRESS_MIN_BYTES,
+    append_jsonl,
+    compress_bytes,
+    decompress_bytes,
+    file_lock,
+    file_version,
+    json_dumps,
+    json_file_stems,
+    json_loads,
+    read_jsonl,
+    write_jsonl,
+)
+
+
+# Hidden files, so they are not listed as results
+LATEST_INDEX_FILENAME = ".latest_index.json"
+RESULTS_LOG_FILENAME = ".results.jsonl"
+
+# Results read serially below this many, and per thread-pool batch above it
+LOAD_BATCH_SIZE = 64
+
+# Result fields kept in the results log, i.e. those query_results filters on
+INDEXED_FIELDS = (
+    "upstream_package",
+    "upstream_version",
+    "downstream_package",
+    "status",
+    "started_at",
+)
+
+
+def _iso_key(timestamp) -> str:
+    """Sortable ISO string of a naive timestamp (a datetime or its str/isoformat).
+
+    Older results were serialized with ``str(datetime)``, which separates date
+    and time with a space rather than ``T``.
+    """
+    return str(timestamp).replace(" ", "T", 1)
+
+
+def _started_at_key(record: dict) -> str:
+    return _iso_key(record["started_at"])
+
+
+def _log_record(test_id: str, result: TestResult) -> dict:
+    return {"test_id": test_id, **{field: result[field] for field in INDEXED_FIELDS}}
+
+
+# Log lines start with the test_id (see _log_record)
+_TEST_ID_RE = re.compile(rb'^\{"test_id":("(?:[^"\\]|\\.)*")')
+
+
+def _line_test_id(line: bytes) -> str | None:
+    match = _TEST_ID_RE.match(line)
+    return json_loads(match.group(1)) if match else None
 
 
 class ResultsLedger(MutableMapping):
     """Store test results with test_id as key.
 
-    Uses dol for storage abstraction.
+    Backed by one JSON file per result.
+
+    Also keeps a small ``{upstream: {downstream: [test_id, started_at]}}`` index
+    of the latest result per package pair, persisted next to the results, so
+    `get_latest_result` doesn't scan the ledger.
+
+    Every write is also appended to a log of the ``INDEXED_FIELDS`` of each
+    result, so queries scan that one file and only load matching results. The
+    result files remain the source of truth: the log is rebuilt from them when
+    missing or when superseded records make it too long.
+
+    With ``compress=True``, results of at least ``COMPRESS_MIN_BYTES`` (mostly
+    long test output) are written compressed (zstd if installed, else gzip).
+    Either kind is read back.
     """
 
-    def __init__(self, store_path: str = None):
+    def __init__(self, store_path: str = None, compress: bool = False):
         if store_path is None:
             import appdirs
 
             store_path = Path(appdirs.user_data_dir("wary")) / "results"
+        self.store_path = Path(store_path)
+        self.store_path.mkdir(parents=True, exist_ok=True)
+        self.compress = compress
 
-        from dol import Files
-
-        self._store = Files(str(store_path))
+        self._latest_index_path = self.store_path / LATEST_INDEX_FILENAME
+        self._results_log_path = self.store_path / RESULTS_LOG_FILENAME
+        self._latest_by_pair = None
+        self._latest_index_mtime = None
+        # Guards the in-memory index when one ledger is shared across threads
+        self._index_lock = threading.RLock()
 
     def __getitem__(self, test_id: str) -> TestResult:
-        data_bytes = self._store[f"{test_id}.json"]
-        return json.loads(data_bytes.decode('utf-8'))
+        result = self._read_result(test_id)
+        if result is None:
+            raise KeyError(test_id)
+        return result
 
     def __setitem__(self, test_id: str, result: TestResult):
-        self._store[f"{test_id}.json"] = json.dumps(result, default=str).encode('utf-8')
+        data = json_dumps(result)
+        if self.compress and len(data) >= COMPRESS_MIN_BYTES:
+            data = compress_bytes(data)
+        (self.store_path / f"{test_id}.json").write_bytes(data)
+        self._update_latest_index(test_id, result)
+        append_jsonl(self._results_log_path, _log_record(test_id, result))
 
     def __delitem__(self, test_id: str):
-        del self._store[f"{test_id}.json"]
+        try:
+            (self.store_path / f"{test_id}.json").unlink()
+        except FileNotFoundError:
+            raise KeyError(test_id)
+        append_jsonl(self._results_log_path, {"test_id": test_id, "deleted": True})
+        # Cheaper to rebuild lazily than to find the pair's next-latest result
+        with self._index_lock:
+            self._latest_index_path.unlink(missing_ok=True)
+            self._latest_by_pair = None
 
-    def __iter__(self):
-        for key in self._store:
-            yield key.replace(".json", "")
+    def __iter__(self) -> Iterator[str]:
+        return json_file_stems(self.store_path)
 
     def __len__(self):
-        return len(list(self._store))
+        return sum(1 for _ in json_file_stems(self.store_path))
+
+    def data_version(self) -> tuple:
+        """A token that changes whenever results are added or deleted.
+
+        Cheap (a stat of the results log), e.g. to validate HTTP caches.
+        """
+        version = file_version(self._results_log_path)
+        if version == (0, 0):
+            # Writes only append to an existing log, so build it to track them
+            self._rebuild_results_log()
+            version = file_version(self._results_log_path)
+        return version
 
     def add_result(self, result: TestResult):
         """Add a test result."""
         self[result["test_id"]] = result
 
+    def add_results_bulk(self, results: list[TestResult]):
+        """Add several test results."""
+        for result in results:
+            self.add_result(result)
+
+    def iter_results(
+        self,
+        upstream_package: str = None,
+        downstream_package: str = None,
+        status: str = None,
+        after: datetime = None,
+        upstream_version: str = None,
+        output_limit: int = None,
+        limit: int = None,
+    ) -> Iterator[TestResult]:
+        """Lazily yield results matching the filters, newest first.
+
+        Matching results are read from disk in batches on a thread pool. The
+        order (and ``limit``) is worked out from the results log, so only the
+        results yielded are read.
+
+        If ``output_limit`` is given, each result's ``output`` is truncated to
+        that many characters as it is loaded.
+        """
+        records = self._matching_records(
+            upstream_package=upstream_package,
+            downstream_package=downstream_package,
+            status=status,
+            after=after,
+            upstream_version=upstream_version,
+        )
+        if limit is None:
+            records = sorted(records, key=_started_at_key, reverse=True)
+        else:
+            records = heapq.nlargest(limit, records, key=_started_at_key)
+        test_ids = [record["test_id"] for record in records]
+
+        for result in self._load_results(test_ids):
+            if result is None:
+                # Deleted by another process since the log was read
+                continue
+
+            if output_limit is not None:
+                result["output"] = result["output"][:output_limit]
+
+            yield result
+
+    def _matching_records(
+        self,
+        upstream_package: str = None,
+        downstream_package: str = None,
+        status: str = None,
+        after: datetime = None,
+        upstream_version: str = None,
+    ) -> Iterator[dict]:
+        """Yield the results log records matching the filters."""
+        needles = tuple(
+            b'"%s":%s' % (field.encode(), json_dumps(value))
+            for field, value in (
+                ("upstream_package", upstream_package),
+                ("upstream_version", upstream_version),
+                ("downstream_package", downstream_package),
+                ("status", status),
+            )
+            if value
+        )
+        after_key = _iso_key(after) if after else None
+        for record in self._log_records(needles).values():
+            if upstream_package and record["upstream_package"] != upstream_package:
+                continue
+            if upstream_version and record["upstream_version"] != upstream_version:
+                continue
+            if downstream_package and record["downstream_package"] != downstream_package:
+                continue
+            if status and record["status"] != status:
+                continue
+            if after and _iso_key(record["started_at"]) < after_key:
+                continue
+
+            yield record
+
+    def _read_result(self, test_id: str) -> TestResult | None:
+        try:
+            with open(self.store_path / f"{test_id}.json", "rb") as f:
+                return json_loads(decompress_bytes(f.read()))
+        except FileNotFoundError:
+            return None
+
+    def _load_results(self, test_ids: list[str]) -> Iterator[TestResult | None]:
+        """Read results in order, overlapping file reads across threads."""
+        if len(test_ids) <= LOAD_BATCH_SIZE:
+            yield from map(self._read_result, test_ids)
+            return
+
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Batched, so a consumer that stops early doesn't wait on every read
+            for i in range(0, len(test_ids), LOAD_BATCH_SIZE):
+                batch = test_ids[i : i + LOAD_BATCH_SIZE]
+                yield from executor.map(self._read_result, batch)
+
     def query_results(
         self,
         upstream_package: str = None,
         downstream_package: str = None,
         status: str = None,
         after: datetime = None,
+        upstream_version: str = None,
+        output_limit: int = None,
+        limit: int = None,
     ) -> list[TestResult]:
-        """Query results with filters."""
-        results = []
+        """Query results with filters, newest first (at most ``limit`` of them)."""
+        return list(
+            self.iter_results(
+                upstream_package=upstream_package,
+                downstream_package=downstream_package,
+                status=status,
+                after=after,
+                upstream_version=upstream_version,
+                output_limit=output_limit,
+                limit=limit,
+            )
+        )
 
-        for test_id in self:
-            result = self[test_id]
+    def _log_records(self, needles: tuple[bytes, ...] = ()) -> dict[str, dict]:
+        """Replay the results log into ``{test_id: record}``.
 
-            if upstream_package and result["upstream_package"] != upstream_package:
-                continue
-            if downstream_package and result["downstream_package"] != downstream_package:
+        Lines lacking any of ``needles`` (raw ``"field":value`` bytes) are not
+        parsed: they can't match, and only evict an earlier record for the same
+        test_id.
+        """
+        try:
+            with open(self._results_log_path, "rb") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return self._rebuild_results_log()
+
+        records_by_id = {}
+        for line in lines:
+            if not line:
                 continue
-            if status and result["status"] != status:
+            if needles and not all(needle in line for needle in needles):
+                records_by_id.pop(_line_test_id(line), None)
                 continue
-            if after:
-                result_time = datetime.fromisoformat(result["started_at"])
-                if result_time < after:
-                    continue
+            record = json_loads(line)
+            if record.get("deleted"):
+                records_by_id.pop(record["test_id"], None)
+            else:
+                records_by_id[record["test_id"]] = record
+
+        if not needles and len(lines) > 2 * len(records_by_id) + 100:
+            return self._rebuild_results_log()
+        return records_by_id
 
-            results.append(result)
+    def _rebuild_results_log(self) -> dict[str, dict]:
+        # Locked, so a result written meanwhile is appended to the new log
+        with file_lock(self._results_log_path):
+            records_by_id = {}
+            for test_id in self:
+                result = self._read_result(test_id)
+                if result is not None:  # Deleted since listed
+                    records_by_id[test_id] = _log_record(test_id, result)
+            write_jsonl(self._results_log_path, records_by_id.values())
+        return records_by_id
 
-        return results
+    def has_results(self, **filters) -> bool:
+        """Check whether any result matches the filters, stopping at the first.
+
+        Takes the same filters as `iter_results`, and only reads the results log.
+        """
+        # Options of iter_results that don't filter
+        filters.pop("output_limit", None)
+        filters.pop("limit", None)
+        return any(True for _ in self._matching_records(**filters))
+
+    def status_counts(self, upstream_package: str = None) -> Counter:
+        """Count results (of ``upstream_package``, if given) by status.
+
+        Only reads the results log.
+        """
+        return Counter(
+            record["status"]
+            for record in self._matching_records(upstream_package=upstream_package)
+        )
 
     def get_latest_result(
         self, upstream_package: str, downstream_package: str
     ) -> TestResult | None:
         """Get most recent result for package pair."""
-        results = self.query_results(
-            upstream_package=upstream_package, downstream_package=downstream_package
-        )
-
-        if not results:
+        with self._index_lock:
+            index = self._latest_index()
+            entry = index.get(upstream_package, {}).get(downstream_package)
+        if entry is None:
             return None
+        return self[entry[0]]
 
-        # Sort by started_at descending
-        results.sort(
-            key=lambda r: datetime.fromisoformat(r["started_at"]), reverse=True
-        )
+    def _latest_index(self) -> dict:
+        """Load the latest-result index, rebuilding it if absent or stale."""
+        try:
+            mtime = self._latest_index_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._latest_by_pair = self._build_latest_index()
+            self._save_latest_index()
+            return self._latest_by_pair
+
+        if self._latest_by_pair is None or mtime != self._latest_index_mtime:
+            self._latest_by_pair = json_loads(self._latest_index_path.read_bytes())
+            self._latest_index_mtime = mtime
+        return self._latest_by_pair
+
+    def _build_latest_index(self) -> dict:
+        index = {}
+        for test_id in self:
+            result = self[test_id]
+            self._index_if_newer(index, test_id, result)
+        return index
+
+    @staticmethod
+    def _index_if_newer(index: dict, test_id: str, result: TestResult) -> bool:
+        by_downstream = index.setdefault(result["upstream_package"], {})
+        current = by_downstream.get(result["downstream_package"])
+        started_at = _iso_key(result["started_at"])
+        if current is not None and current[1] > started_at:
+            return False
+        by_downstream[result["downstream_package"]] = [test_id, started_at]
+        return True
+
+    def _update_latest_index(self, test_id: str, result: TestResult):
+        if not self._latest_index_path.exists():
+            # Built from the store (which already includes this result) on demand
+            return
+        with self._index_lock:
+            if self._index_if_newer(self._latest_index(), test_id, result):
+                self._save_latest_index()
 
-        return results[0]
+    def _save_latest_index(self):
+        self._latest_index_path.write_bytes(json_dumps(self._latest_by_pair))
+        self._latest_index_mtime = self._latest_index_path.stat().st_mtime_ns
@@ -89,6 +89,36 @@ class SimpleAPI:
         return None
 
 
+def _make_view(handler: Callable) -> Callable:
+    """Make a Flask view that calls ``handler`` with the request's params."""
+    from flask import request, jsonify
+
+    @wraps(handler)
+    def view(*args, **kwargs):
+        try:
+            # Get request data
+            if request.method in ['POST', 'PUT']:
+                data = request.get_json()
+                kwargs.update(data or {})
+
+            # Get query params
+            kwargs.update(request.args.to_dict())
+
+            # Call handler
+            result = handler(*args, **kwargs)
+
+            # Handle tuple response (data, status_code)
+            if isinstance(result, tuple):
+                return jsonify(result[0]), result[1]
+            else:
+                return jsonify(result)
+
+        except Exception as e:
+            return jsonify({'error': str(e), 'type': type(e).__name__}), 500
+
+    return view
+
+
 def create_flask_from_functions(functions: dict[str, Callable], base_path: str = '/api'):
     """Create a Flask app from a dictionary of functions.
 
@@ -99,39 +129,19 @@ def create_flask_from_functions(functions: dict[str, Callable], base_path: str =
     Returns:
         Flask app
     """
-    from flask import Flask, request, jsonify
+    from flask import Flask
 
     app = Flask(__name__)
 
     for path, handler in functions.items():
         full_path = f"{base_path}/{path.lstrip('/')}"
-
-        @app.route(full_path, methods=['GET', 'POST', 'PUT', 'DELETE'])
-        @wraps(handler)
-        def route_handler(*args, **kwargs):
-            try:
-                # Get request data
-                if request.method in ['POST', 'PUT']:
-                    data = request.get_json()
-                    kwargs.update(data or {})
-
-                # Get query params
-                kwargs.update(request.args.to_dict())
-
-                # Call handler
-                result = handler(*args, **kwargs)
-
-                # Handle tuple response (data, status_code)
-                if isinstance(result, tuple):
-                    return jsonify(result[0]), result[1]
-                else:
-                    return jsonify(result)
-
-            except Exception as e:
-                return jsonify({'error': str(e), 'type': type(e).__name__}), 500
-
-        # Store the handler with a unique name
-        route_handler.__name__ = f"handler_{path.replace('/', '_')}"
+        # Each route gets its own view, under a unique endpoint name
+        app.add_url_rule(
+            full_path,
+            endpoint=f"handler_{path.replace('/', '_')}",
+            view_func=_make_view(handler),
+            methods=['GET', 'POST', 'PUT', 'DELETE'],
+        )
 
     return app
 
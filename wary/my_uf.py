@@ -4,9 +4,13 @@ This module provides utilities for creating web UIs that we'd like
 to see in uf. These can be moved to uf later.
 """
 
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Iterator, Optional
 from dataclasses import dataclass
 from enum import Enum
+import html
+
+import jinja2
+from markupsafe import Markup, escape
 
 
 class ComponentType(Enum):
@@ -24,6 +28,76 @@ class ComponentType(Enum):
     BADGE = "badge"
 
 
+# Values are HTML-escaped unless they are `Markup`, like the output of
+# `Component.to_html` (so components nest) or markup built by the caller
+_env = jinja2.Environment(autoescape=True)
+
+# Compiled once; `Component.to_html` renders them with ``content`` and the props
+COMPONENT_TEMPLATES = {
+    ComponentType.HEADING: _env.from_string(
+        "{% set level = level | default(1) %}<h{{ level }}>{{ content }}</h{{ level }}>"
+    ),
+    ComponentType.TEXT: _env.from_string("<p>{{ content }}</p>"),
+    ComponentType.TABLE: _env.from_string(
+        '<table class="table">\n<thead><tr>\n'
+        "{% for col in columns %}<th>{{ col }}</th>\n{% endfor %}"
+        "</tr></thead>\n<tbody>\n"
+        "{% for row in content %}<tr>\n"
+        "{% for cell in row %}<td>{{ cell }}</td>\n{% endfor %}"
+        "</tr>\n{% endfor %}"
+        "</tbody>\n</table>"
+    ),
+    ComponentType.STATS: _env.from_string(
+        '<div class="stats-container">\n'
+        "{% for stat in content %}"
+        '<div class="stat-item">\n'
+        '<div class="stat-value">{{ stat.get("value", "") }}</div>\n'
+        '<div class="stat-label">{{ stat.get("label", "") }}</div>\n'
+        "</div>\n{% endfor %}"
+        "</div>"
+    ),
+    ComponentType.LIST: _env.from_string(
+        "{% set tag = 'ol' if ordered else 'ul' %}"
+        "<{{ tag }}>\n{% for item in content %}<li>{{ item }}</li>\n{% endfor %}</{{ tag }}>"
+    ),
+}
+_DEFAULT_TEMPLATE = _env.from_string("<div>{{ content }}</div>")
+
+# Badge markup around the content, for the colors styled in _DEFAULT_STYLES
+_BADGE_TMPL = {
+    color: (Markup(f'<span class="badge badge-{color}">'), Markup('</span>'))
+    for color in ('gray', 'green', 'red', 'blue')
+}
+
+
+def _badge_to_html(content, color='gray', **props) -> Markup:
+    """Badge HTML, from the prebuilt markup for the known colors."""
+    pre, post = _BADGE_TMPL.get(color) or (
+        Markup('<span class="badge badge-{}">').format(color),
+        Markup('</span>'),
+    )
+    return pre + escape(content) + post
+
+
+def _card_to_html(content, title=None, **props) -> Markup:
+    """Card HTML, with a header only if there is a title."""
+    header = (
+        Markup('<div class="card-header">{}</div>\n').format(title) if title else ''
+    )
+    return Markup(
+        '<div class="card">\n{}<div class="card-body">{}</div>\n</div>'
+    ).format(header, content)
+
+
+# Small components that pages render many of (e.g. a status badge per result)
+# are built directly, without a template render; these take precedence over
+# `COMPONENT_TEMPLATES`
+COMPONENT_RENDERERS = {
+    ComponentType.BADGE: _badge_to_html,
+    ComponentType.CARD: _card_to_html,
+}
+
+
 @dataclass
 class Component:
     """Base UI component."""
@@ -36,140 +110,60 @@ class Component:
         if self.props is None:
             self.props = {}
 
-    def to_html(self) -> str:
-        """Convert component to HTML."""
-        if self.type == ComponentType.HEADING:
-            level = self.props.get('level', 1)
-            return f"<h{level}>{self.content}</h{level}>"
+    def to_html(self) -> Markup:
+        """Convert component to HTML.
 
-        elif self.type == ComponentType.TEXT:
-            return f"<p>{self.content}</p>"
+        Content and props are escaped, except for `Markup` values.
+        """
+        renderer = COMPONENT_RENDERERS.get(self.type)
+        if renderer is not None:
+            return renderer(self.content, **self.props)
+        template = COMPONENT_TEMPLATES.get(self.type, _DEFAULT_TEMPLATE)
+        return Markup(template.render(content=self.content, **self.props))
 
-        elif self.type == ComponentType.TABLE:
-            return self._table_to_html()
+    def iter_html(self) -> Iterator[str]:
+        """Yield the component's HTML in chunks (by default, all at once)."""
+        yield self.to_html()
 
-        elif self.type == ComponentType.CARD:
-            return self._card_to_html()
 
-        elif self.type == ComponentType.STATS:
-            return self._stats_to_html()
+# Size (in characters) of the chunks `PreformattedCard` streams its text in
+PREFORMATTED_CHUNK_SIZE = 64 * 1024
 
-        elif self.type == ComponentType.LIST:
-            return self._list_to_html()
 
-        elif self.type == ComponentType.BADGE:
-            return self._badge_to_html()
+class PreformattedCard(Component):
+    """A card showing (possibly very long) text as-is, in a ``<pre>`` block.
 
-        else:
-            return f"<div>{self.content}</div>"
-
-    def _table_to_html(self) -> str:
-        """Convert table to HTML."""
-        columns = self.props.get('columns', [])
-        rows = self.content
-
-        html = ['<table class="table">']
-        html.append('<thead><tr>')
-        for col in columns:
-            html.append(f'<th>{col}</th>')
-        html.append('</tr></thead>')
-
-        html.append('<tbody>')
-        for row in rows:
-            html.append('<tr>')
-            for cell in row:
-                html.append(f'<td>{cell}</td>')
-            html.append('</tr>')
-        html.append('</tbody>')
-        html.append('</table>')
-
-        return '\n'.join(html)
-
-    def _card_to_html(self) -> str:
-        """Convert card to HTML."""
-        title = self.props.get('title', '')
-        html = ['<div class="card">']
-        if title:
-            html.append(f'<div class="card-header">{title}</div>')
-        html.append(f'<div class="card-body">{self.content}</div>')
-        html.append('</div>')
-        return '\n'.join(html)
-
-    def _stats_to_html(self) -> str:
-        """Convert stats to HTML."""
-        stats = self.content
-        html = ['<div class="stats-container">']
-
-        for stat in stats:
-            label = stat.get('label', '')
-            value = stat.get('value', '')
-            html.append(f'<div class="stat-item">')
-            html.append(f'<div class="stat-value">{value}</div>')
-            html.append(f'<div class="stat-label">{label}</div>')
-            html.append('</div>')
-
-        html.append('</div>')
-        return '\n'.join(html)
-
-    def _list_to_html(self) -> str:
-        """Convert list to HTML."""
-        items = self.content
-        ordered = self.props.get('ordered', False)
-        tag = 'ol' if ordered else 'ul'
-
-        html = [f'<{tag}>']
-        for item in items:
-            html.append(f'<li>{item}</li>')
-        html.append(f'</{tag}>')
-        return '\n'.join(html)
-
-    def _badge_to_html(self) -> str:
-        """Convert badge to HTML."""
-        color = self.props.get('color', 'gray')
-        return f'<span class="badge badge-{color}">{self.content}</span>'
+    `iter_html` escapes and yields the text in chunks, so a page streamed with
+    `Page.iter_html` never holds an escaped copy of all of it.
+    """
 
+    def __init__(self, title: str, text: str):
+        super().__init__(type=ComponentType.CARD, content=text, props={'title': title})
 
-@dataclass
-class Page:
-    """A web page with components."""
-
-    title: str
-    components: list[Component]
-    styles: Optional[str] = None
-
-    def to_html(self) -> str:
-        """Convert page to full HTML."""
-        html = [
-            '<!DOCTYPE html>',
-            '<html>',
-            '<head>',
-            f'<title>{self.title}</title>',
-            '<meta charset="utf-8">',
-            '<meta name="viewport" content="width=device-width, initial-scale=1">',
-            self._get_default_styles(),
-        ]
-
-        if self.styles:
-            html.append(f'<style>{self.styles}</style>')
-
-        html.extend(
-            [
-                '</head>',
-                '<body>',
-                '<div class="container">',
-            ]
-        )
+    def iter_html(self) -> Iterator[str]:
+        yield Markup(
+            '<div class="card">\n<div class="card-header">{}</div>\n'
+            '<div class="card-body"><pre>'
+        ).format(self.props['title'])
+        text = self.content
+        for i in range(0, len(text), PREFORMATTED_CHUNK_SIZE):
+            # Quotes needn't be escaped in element text
+            yield html.escape(text[i : i + PREFORMATTED_CHUNK_SIZE], quote=False)
+        yield '</pre></div>\n</div>'
 
-        for component in self.components:
-            html.append(component.to_html())
+    def to_html(self) -> Markup:
+        return Markup(''.join(self.iter_html()))
 
-        html.extend(['</div>', '</body>', '</html>'])
 
-        return '\n'.join(html)
+_HTML_HEAD_PREFIX = '<!DOCTYPE html>\n<html>\n<head>\n'
+_HTML_META = (
+    '<meta charset="utf-8">\n'
+    '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+)
+_HTML_BODY_PREFIX = '</head>\n<body>\n<div class="container">\n'
+_HTML_BODY_SUFFIX = '</div>\n</body>\n</html>'
 
-    def _get_default_styles(self) -> str:
-        """Get default CSS styles."""
-        return """
+_DEFAULT_STYLES = """
 <style>
 body {
     font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
@@ -268,12 +262,54 @@ h1, h2, h3, h4, h5, h6 {
 """
 
 
+@dataclass
+class Page:
+    """A web page with components."""
+
+    title: str
+    components: list[Component]
+    styles: Optional[str] = None
+
+    def to_html(self) -> str:
+        """Convert page to full HTML."""
+        return ''.join(self.iter_html())
+
+    def iter_html(self) -> Iterator[str]:
+        """Yield the page's HTML in chunks: the head, then each component's.
+
+        Suitable for a streamed response (e.g. ``flask.Response(page.iter_html())``).
+        """
+        styles = f'\n<style>{self.styles}</style>' if self.styles else ''
+        yield (
+            f'{_HTML_HEAD_PREFIX}<title>{escape(self.title)}</title>\n{_HTML_META}'
+            f'{self._get_default_styles()}{styles}\n{_HTML_BODY_PREFIX}'
+        )
+        for component in self.components:
+            yield from component.iter_html()
+            yield '\n'
+        yield _HTML_BODY_SUFFIX
+
+    def _get_default_styles(self) -> str:
+        """Get default CSS styles."""
+        return _DEFAULT_STYLES
+
+
 class SimpleApp:
-    """A simple web app builder."""
+    """A simple web app builder.
+
+    Rendered pages are cached per path until `invalidate` is called (e.g. when
+    the data the pages show changes).
+    """
 
     def __init__(self, title: str = "App"):
         self.title = title
         self.routes = {}
+        self._cache: dict[str, tuple[int, str]] = {}
+        self._version = 0
+
+    def invalidate(self):
+        """Drop all cached pages, so they are re-rendered on next request."""
+        self._version += 1
 
     def page(self, path: str, title: str = None):
         """Register a page route."""
@@ -291,14 +327,22 @@ class SimpleApp:
         if not route:
             return None
 
+        version = self._version
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
         handler = route['handler']
         page = handler()
 
         if isinstance(page, Page):
-            return page.to_html()
+            html = page.to_html()
         else:
             # Assume it's already HTML
-            return str(page)
+            html = str(page)
+
+        self._cache[path] = (version, html)
+        return html
 
 
 def make_table(columns: list[str], rows: list[list]) -> Component:
@@ -1,8 +1,16 @@
 """Test orchestration for wary."""
 
+import asyncio
+import importlib.metadata
+import os
+import shlex
+import shutil
 import subprocess
+import sys
 import tempfile
 import venv
+from collections.abc import Sequence
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 import uuid
@@ -11,28 +19,171 @@ from wary.base import TestResult
 from wary.ledger import ResultsLedger
 from wary.graph import DependencyGraph
 
+# Test output kept in a result; the full log is kept aside when longer
+OUTPUT_TAIL_BYTES = 1_000_000
+
+
+async def _run_subprocess(
+    args: list[str], timeout: float = None, cwd=None, log_file=None
+) -> subprocess.CompletedProcess:
+    """Async analogue of ``subprocess.run(args, capture_output=True, text=True)``.
+
+    If ``log_file`` (a binary file object) is given, stdout and stderr are both
+    written to it instead of being captured, and the result's are ``None``.
+
+    Kills the child and raises ``subprocess.TimeoutExpired`` on timeout. The
+    child is also killed if the awaiting task is cancelled, so cancelling many
+    concurrent runs (e.g. on Ctrl-C) leaves no orphan processes.
+    """
+    if log_file is None:
+        stdout, stderr = asyncio.subprocess.PIPE, asyncio.subprocess.PIPE
+    else:
+        stdout, stderr = log_file, asyncio.subprocess.STDOUT
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=stdout,
+        stderr=stderr,
+        cwd=cwd,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise subprocess.TimeoutExpired(args, timeout)
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+        raise
+
+    return subprocess.CompletedProcess(
+        args,
+        proc.returncode,
+        stdout.decode(errors="replace") if stdout is not None else None,
+        stderr.decode(errors="replace") if stderr is not None else None,
+    )
+
+
+@lru_cache(maxsize=1024)
+def _split_command(test_command: str) -> tuple[str, ...]:
+    """Shell-split a test command (commands repeat across dependents, so cached)."""
+    return tuple(shlex.split(test_command))
+
+
+def _read_tail(path: Path, max_bytes: int) -> tuple[str, bool]:
+    """Read the last ``max_bytes`` of a file, and whether that is all of it."""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - max_bytes))
+        return f.read().decode("utf-8", errors="replace"), size <= max_bytes
+
+
+def _installed_version(venv_path: Path, package: str) -> str:
+    """Version of ``package`` installed in a venv, read from its metadata.
+
+    Reads the venv's site-packages directly, rather than paying a ``pip show``.
+    """
+    site_packages = [str(p) for p in venv_path.glob("lib/python*/site-packages")]
+    for dist in importlib.metadata.distributions(name=package, path=site_packages):
+        return dist.version
+    return "unknown"
+
 
 class TestOrchestrator:
     """Orchestrate test runs for dependent packages.
 
     Creates isolated virtual environments, installs packages,
     runs tests, captures results.
+
+    Each test's venv is a copy of a template venv (with pip already
+    bootstrapped) that is built once, under ``template_venv_dir``.
+
+    Test output is streamed to a file rather than held in memory. Results keep
+    its last ``OUTPUT_TAIL_BYTES``; longer logs are kept in full, as
+    ``{log_dir}/{test_id}.log``.
     """
 
-    def __init__(self, results_ledger=None):
-        self.results_ledger = results_ledger or ResultsLedger()
+    def __init__(
+        self, results_ledger=None, template_venv_dir: str = None, log_dir: str = None
+    ):
+        # Not `or`: an empty ledger is falsy
+        if results_ledger is None:
+            results_ledger = ResultsLedger()
+        self.results_ledger = results_ledger
+        if log_dir is None:
+            import appdirs
+
+            log_dir = Path(appdirs.user_data_dir("wary")) / "logs"
+        self.log_dir = Path(log_dir)
+        if template_venv_dir is None:
+            import appdirs
+
+            template_venv_dir = Path(appdirs.user_cache_dir("wary")) / "venvs"
+        self.template_venv_dir = Path(template_venv_dir)
+        # uv installs much faster than pip; use it when available
+        self._uv = shutil.which("uv")
+
+    def _template_venv(self) -> Path:
+        """Path of the template venv for this Python, creating it if missing."""
+        version = f"{sys.version_info.major}.{sys.version_info.minor}"
+        template = self.template_venv_dir / f"python{version}"
+        if not template.exists():
+            self.template_venv_dir.mkdir(parents=True, exist_ok=True)
+            # Build aside and rename, so concurrent runs never see a partial venv
+            tmp = Path(tempfile.mkdtemp(dir=self.template_venv_dir))
+            venv.create(tmp / "venv", with_pip=True)
+            try:
+                os.rename(tmp / "venv", template)
+            except OSError:
+                pass  # Another run created it first
+            shutil.rmtree(tmp, ignore_errors=True)
+        return template
+
+    def _create_venv(self, venv_path: Path):
+        """Create a venv with pip at venv_path, by copying the template venv."""
+        shutil.copytree(self._template_venv(), venv_path, symlinks=True)
 
     def run_test(
         self,
         upstream_package: str,
         upstream_version: str,
         downstream_package: str,
-        test_command: str = "pytest",
+        test_command: str | Sequence[str] = "pytest",
         python_version: str = "python3",
         timeout: int = 600,
+        record: bool = True,
     ) -> TestResult:
         """Run tests for a dependent package.
 
+        Blocking wrapper around `arun_test`.
+        """
+        return asyncio.run(
+            self.arun_test(
+                upstream_package=upstream_package,
+                upstream_version=upstream_version,
+                downstream_package=downstream_package,
+                test_command=test_command,
+                python_version=python_version,
+                timeout=timeout,
+                record=record,
+            )
+        )
+
+    async def arun_test(
+        self,
+        upstream_package: str,
+        upstream_version: str,
+        downstream_package: str,
+        test_command: str | Sequence[str] = "pytest",
+        python_version: str = "python3",
+        timeout: int = 600,
+        record: bool = True,
+    ) -> TestResult:
+        """Run tests for a dependent package.
+
+        ``test_command`` is a shell-style string or an already split sequence.
+        Completed tests are added to the ledger, unless ``record`` is false.
+
         Steps:
         1. Create temporary venv
         2. Install upstream package at specified version
@@ -40,9 +191,18 @@ class TestOrchestrator:
         4. Run test command
         5. Capture results
         6. Cleanup
+
+        Subprocesses are awaited rather than blocked on, so many tests can run
+        concurrently on one event loop. Timeouts don't raise: a test run that
+        times out is a ``fail`` result, and a timed out install an ``error`` one.
         """
         test_id = str(uuid.uuid4())
         started_at = datetime.now()
+        if isinstance(test_command, str):
+            test_args = _split_command(test_command)
+        else:
+            test_args = tuple(test_command)
+            test_command = shlex.join(test_args)
 
         with tempfile.TemporaryDirectory() as tmpdir:
             tmpdir = Path(tmpdir)
@@ -50,19 +210,32 @@ class TestOrchestrator:
 
             # Create venv
             print(f"Creating venv at {venv_path}")
-            venv.create(venv_path, with_pip=True)
+            await asyncio.to_thread(self._create_venv, venv_path)
 
-            pip = venv_path / "bin" / "pip"
             python = venv_path / "bin" / "python"
+            # Not the pip script: its shebang points at the template venv
+            pip = [str(python), "-m", "pip"]
+            if self._uv:
+                pip_install = [self._uv, "pip", "install", "--python", str(python)]
+            else:
+                pip_install = [*pip, "install", "--prefer-binary"]
 
             # Install upstream at specific version
             print(f"Installing {upstream_package}=={upstream_version}")
-            install_result = subprocess.run(
-                [str(pip), "install", f"{upstream_package}=={upstream_version}"],
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-            )
+            try:
+                install_result = await _run_subprocess(
+                    [*pip_install, f"{upstream_package}=={upstream_version}"],
+                    timeout=timeout,
+                )
+            except subprocess.TimeoutExpired:
+                return self._create_error_result(
+                    test_id,
+                    upstream_package,
+                    upstream_version,
+                    downstream_package,
+                    started_at,
+                    f"Timed out installing {upstream_package} after {timeout}s",
+                )
 
             if install_result.returncode != 0:
                 return self._create_error_result(
@@ -76,12 +249,20 @@ class TestOrchestrator:
 
             # Install downstream package
             print(f"Installing {downstream_package}")
-            downstream_install = subprocess.run(
-                [str(pip), "install", downstream_package],
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-            )
+            try:
+                downstream_install = await _run_subprocess(
+                    [*pip_install, downstream_package],
+                    timeout=timeout,
+                )
+            except subprocess.TimeoutExpired:
+                return self._create_error_result(
+                    test_id,
+                    upstream_package,
+                    upstream_version,
+                    downstream_package,
+                    started_at,
+                    f"Timed out installing {downstream_package} after {timeout}s",
+                )
 
             if downstream_install.returncode != 0:
                 return self._create_error_result(
@@ -94,30 +275,37 @@ class TestOrchestrator:
                 )
 
             # Get downstream version
-            version_check = subprocess.run(
-                [str(pip), "show", downstream_package], capture_output=True, text=True
-            )
-            downstream_version = "unknown"
-            for line in version_check.stdout.split("\n"):
-                if line.startswith("Version:"):
-                    downstream_version = line.split(":", 1)[1].strip()
+            downstream_version = _installed_version(venv_path, downstream_package)
 
             # Get commit hash (if git repo)
             commit_hash = "unknown"
 
             # Run tests
             print(f"Running: {test_command}")
-            test_result = subprocess.run(
-                test_command.split(),
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                cwd=tmpdir,
-            )
+            log_path = tmpdir / "test.log"
+            with open(log_path, "wb") as log_file:
+                try:
+                    test_result = await _run_subprocess(
+                        test_args,
+                        timeout=timeout,
+                        cwd=tmpdir,
+                        log_file=log_file,
+                    )
+                    exit_code, timed_out = test_result.returncode, False
+                except subprocess.TimeoutExpired:
+                    # A hung test suite fails, like one that exits non-zero
+                    exit_code, timed_out = -1, True
 
             finished_at = datetime.now()
 
-            status = "pass" if test_result.returncode == 0 else "fail"
+            output, complete = _read_tail(log_path, OUTPUT_TAIL_BYTES)
+            if not complete:
+                self.log_dir.mkdir(parents=True, exist_ok=True)
+                shutil.move(log_path, self.log_dir / f"{test_id}.log")
+            if timed_out:
+                output += f"\nTimed out after {timeout}s"
+
+            status = "pass" if exit_code == 0 else "fail"
 
             result = TestResult(
                 test_id=test_id,
@@ -130,13 +318,14 @@ class TestOrchestrator:
                 status=status,
                 started_at=started_at,
                 finished_at=finished_at,
-                output=test_result.stdout + "\n" + test_result.stderr,
-                exit_code=test_result.returncode,
+                output=output,
+                exit_code=exit_code,
                 environment={"python_version": python_version},
             )
 
             # Store in ledger
-            self.results_ledger.add_result(result)
+            if record:
+                self.results_ledger.add_result(result)
 
             return result
 
@@ -167,25 +356,79 @@ class TestOrchestrator:
         )
 
     def test_all_dependents(
-        self, upstream_package: str, upstream_version: str, graph: DependencyGraph
+        self,
+        upstream_package: str,
+        upstream_version: str,
+        graph: DependencyGraph,
+        max_concurrent: int = None,
     ) -> list[TestResult]:
-        """Test all registered dependents of a package."""
+        """Test all registered dependents of a package.
+
+        Dependents are tested concurrently (see `atest_all_dependents`); results
+        are returned in the order of ``graph.get_dependents``.
+        """
+        return asyncio.run(
+            self.atest_all_dependents(
+                upstream_package, upstream_version, graph, max_concurrent=max_concurrent
+            )
+        )
+
+    async def atest_all_dependents(
+        self,
+        upstream_package: str,
+        upstream_version: str,
+        graph: DependencyGraph,
+        max_concurrent: int = None,
+    ) -> list[TestResult]:
+        """Async `test_all_dependents`.
+
+        At most ``max_concurrent`` tests (default: twice the CPU count) run at once.
+        Results are added to the ledger together, once all tests are done. A test
+        that raises gets an ``error`` result, so it doesn't lose the others'.
+        """
         dependents = graph.get_dependents(upstream_package)
-        results = []
+        sem = asyncio.Semaphore(max_concurrent or 2 * (os.cpu_count() or 1))
 
-        for edge in dependents:
+        async def _test(edge):
             downstream = edge["downstream"]
             test_cmd = edge["metadata"].get("test_command", "pytest")
 
-            print(f"\nTesting {downstream}...")
-            result = self.run_test(
-                upstream_package=upstream_package,
-                upstream_version=upstream_version,
-                downstream_package=downstream,
-                test_command=test_cmd,
-            )
-            results.append(result)
+            async with sem:
+                print(f"\nTesting {downstream}...")
+                started_at = datetime.now()
+                try:
+                    result = await self.arun_test(
+                        upstream_package=upstream_package,
+                        upstream_version=upstream_version,
+                        downstream_package=downstream,
+                        test_command=test_cmd,
+                        record=False,
+                    )
+                except Exception as e:
+                    # E.g. a missing test command: one dependent's error mustn't
+                    # lose the others' results
+                    result = self._create_error_result(
+                        str(uuid.uuid4()),
+                        upstream_package,
+                        upstream_version,
+                        downstream,
+                        started_at,
+                        f"{type(e).__name__}: {e}",
+                    )
+
+            print(f"Result ({downstream}): {result['status']}")
+            return result
+
+        results = list(await asyncio.gather(*map(_test, dependents)))
 
-            print(f"Result: {result['status']}")
+        # Like arun_test, only record completed tests (not install errors)
+        completed = [r for r in results if r["status"] != "error"]
+        if completed:
+            add_results_bulk = getattr(self.results_ledger, "add_results_bulk", None)
+            if add_results_bulk is not None:
+                add_results_bulk(completed)
+            else:
+                for result in completed:
+                    self.results_ledger.add_result(result)
 
         return results
@@ -4,18 +4,75 @@ This module creates a single server that serves both the REST API
 and the web UI on different paths.
 """
 
+from werkzeug.http import parse_etags, quote_etag
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from werkzeug.serving import run_simple
+import hashlib
 import os
 
 from wary.api import create_app as create_api_app
 from wary.ui import create_ui_app
 
 
+class ETagMiddleware:
+    """WSGI middleware adding weak ETags to successful GET responses.
+
+    A request whose ``If-None-Match`` matches gets an empty ``304 Not Modified``,
+    so unchanged pages and API data aren't sent again. Responses are sent with
+    ``Cache-Control: no-cache`` (unless they set their own), which lets browsers
+    keep them but makes them revalidate each time.
+
+    Streamed responses (those without a ``Content-Length``) are passed through
+    as they are, rather than buffered to be hashed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+            return self.app(environ, start_response)
+
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, headers
+            return lambda data: captured.setdefault('written', []).append(data)
+
+        app_iter = self.app(environ, capture)
+        status, headers = captured['status'], list(captured['headers'])
+        header_names = {name.lower() for name, _ in headers}
+        if 'content-length' not in header_names and 'written' not in captured:
+            start_response(status, headers)
+            return app_iter
+
+        try:
+            body = b''.join([*captured.get('written', []), *app_iter])
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+        if not status.startswith('200') or 'etag' in header_names:
+            start_response(status, headers)
+            return [body]
+
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        cache_headers = [('ETag', quote_etag(digest, weak=True))]
+        if 'cache-control' not in header_names:
+            cache_headers.append(('Cache-Control', 'no-cache'))
+
+        if parse_etags(environ.get('HTTP_IF_NONE_MATCH')).contains_weak(digest):
+            start_response('304 Not Modified', cache_headers)
+            return []
+
+        start_response(status, headers + cache_headers)
+        return [body]
+
+
 def create_combined_app(config=None):
     """Create a combined Flask app with both API and UI.
 
-    The API is mounted at /api and the UI at /.
+    The API is mounted at /api and the UI at /, behind `ETagMiddleware`.
 
     Args:
         config: Optional configuration dict
@@ -31,7 +88,8 @@ def create_combined_app(config=None):
     # UI is the main app, API is mounted at /api
     application = DispatcherMiddleware(ui_app, {'/api': api_app})
 
-    return application
+    # Repeat hits on unchanged pages get a 304 instead of the full body
+    return ETagMiddleware(application)
 
 
 def run_server(host='0.0.0.0', port=8000, use_reloader=True, use_debugger=True):
@@ -107,17 +165,34 @@ def run_production_server(host='0.0.0.0', port=8000):
 
         app = create_combined_app()
 
+        # Requests mostly wait on storage and subprocesses, so threads give the
+        # concurrency; fewer processes means fewer copies of the app in memory.
+        # WARY_WORKER_CLASS=sync (with WARY_WORKERS) restores one request per
+        # process, e.g. to compare.
+        worker_class = os.environ.get('WARY_WORKER_CLASS', 'gthread')
         options = {
             'bind': f'{host}:{port}',
-            'workers': os.cpu_count() * 2 + 1,
-            'worker_class': 'sync',
+            'workers': int(os.environ.get('WARY_WORKERS', os.cpu_count() or 1)),
+            'worker_class': worker_class,
+            'threads': (
+                int(os.environ.get('WARY_THREADS', 8)) if worker_class == 'gthread' else 1
+            ),
+            # Load the app before forking, so workers share its pages
+            # (stores are only opened on first request, in each worker)
+            'preload_app': True,
             'accesslog': '-',
             'errorlog': '-',
             'loglevel': 'info',
         }
+        if os.path.isdir('/dev/shm'):
+            # Worker heartbeat files in memory, not on a possibly slow disk
+            options['worker_tmp_dir'] = '/dev/shm'
 
         print(f"Starting Wary production server on {host}:{port}")
-        print(f"Workers: {options['workers']}")
+        print(
+            f"Workers: {options['workers']} ({worker_class}, "
+            f"{options['threads']} threads each)"
+        )
 
         WaryApplication(app, options).run()
 
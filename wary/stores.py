@@ -3,31 +3,166 @@
 This module provides PostgreSQL-based storage for production use.
 The default file-based storage is fine for local/personal use, but
 PostgreSQL is recommended for shared/production deployments.
+
+SQLite-based storage sits in between: a single local database file, with
+indexed queries instead of a sweep over one JSON file per key.
 """
 
+from collections import Counter
+from collections.abc import Iterator, MutableMapping
+from contextlib import contextmanager
+from pathlib import Path
 from typing import Optional
 from datetime import datetime
 import json
+import sqlite3
+import threading
 
+from wary.util import json_dumps, json_loads
 
-class PostgresDependencyGraph:
-    """Dependency graph backed by PostgreSQL.
 
-    Uses the same interface as DependencyGraph but stores data in PostgreSQL.
+class _PostgresStore:
+    """Base for the PostgreSQL stores: a thread-safe pool of connections.
+
+    Each operation borrows a connection for one transaction (see `_cursor`), so
+    concurrent threads don't queue behind a single connection.
     """
 
-    def __init__(self, connection_string: str):
+    def __init__(self, connection_string: str, max_connections: int = 32):
         try:
-            import psycopg2
+            import psycopg2.extensions
+            import psycopg2.pool
         except ImportError:
             raise ImportError("psycopg2 is required for PostgreSQL storage. Install with: pip install psycopg2-binary")
 
-        self.conn = psycopg2.connect(connection_string)
+        class _Connection(psycopg2.extensions.connection):
+            """A connection that remembers which statements it has prepared."""
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            1, max_connections, connection_string, connection_factory=_Connection
+        )
         self._create_tables()
 
+    def _create_tables(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def _execute_prepared(cur, name: str, statement: str, params: tuple):
+        """Execute ``statement`` (with $1, $2, ... placeholders) as a prepared statement.
+
+        It is parsed and planned once per connection, then run by ``name``.
+        """
+        prepared = cur.connection.prepared
+        if name not in prepared:
+            cur.execute(f"PREPARE {name} AS {statement}")
+            prepared.add(name)
+        placeholders = ", ".join(["%s"] * len(params))
+        cur.execute(f"EXECUTE {name} ({placeholders})", params)
+
+    @staticmethod
+    def _track_version(cur, table: str):
+        """Keep a version of ``table`` in ``wary_versions``, bumped by a trigger.
+
+        The trigger runs once per statement, so a bulk insert bumps it once.
+        The random ``epoch`` tells a recreated table apart from the old one.
+        """
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS wary_versions (
+                name TEXT PRIMARY KEY,
+                epoch TEXT NOT NULL DEFAULT md5(random()::text),
+                version BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        cur.execute(
+            "INSERT INTO wary_versions (name) VALUES (%s) ON CONFLICT DO NOTHING",
+            (table,),
+        )
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION wary_bump_version() RETURNS trigger AS $$
+            BEGIN
+                UPDATE wary_versions SET version = version + 1
+                WHERE name = TG_TABLE_NAME;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        cur.execute(f"""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_trigger WHERE tgname = '{table}_version'
+                ) THEN
+                    CREATE TRIGGER {table}_version
+                    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                    FOR EACH STATEMENT EXECUTE FUNCTION wary_bump_version();
+                END IF;
+            END
+            $$
+        """)
+
+    def _table_version(self, table: str) -> tuple:
+        """The ``(epoch, version)`` of ``table`` (see `_track_version`).
+
+        Kept in the database, so every process sees the same value for the
+        same data (unlike the pg_stat counters, which lag and can be reset).
+        """
+        with self._cursor() as cur:
+            cur.execute(
+                "SELECT epoch, version FROM wary_versions WHERE name = %s", (table,)
+            )
+            return tuple(cur.fetchone() or ())
+
+    @contextmanager
+    def _cursor(self, dict_rows: bool = False):
+        """Cursor on a pooled connection, committed on success, else rolled back.
+
+        With ``dict_rows``, rows are fetched as dicts keyed by column name.
+        """
+        from psycopg2.extras import RealDictCursor
+
+        conn = self.pool.getconn()
+        broken = False
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor if dict_rows else None) as cur:
+                yield cur
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+                # Start over rather than guess whether a failed PREPARE took effect
+                if conn.prepared:
+                    with conn.cursor() as cur:
+                        cur.execute("DEALLOCATE ALL")
+                    conn.commit()
+                    conn.prepared.clear()
+            except Exception:
+                # E.g. the connection died: raise the original error, and
+                # close the connection rather than return it to the pool
+                broken = True
+            raise
+        finally:
+            self.pool.putconn(conn, close=broken)
+
+
+class PostgresDependencyGraph(_PostgresStore):
+    """Dependency graph backed by PostgreSQL.
+
+    Uses the same interface as DependencyGraph but stores data in PostgreSQL.
+    """
+
+    # Selected under the keys of the edge dicts
+    _EDGE_COLUMNS = """
+        upstream, downstream, constraint_spec AS "constraint", risk_score,
+        metadata, registered_at
+    """
+
     def _create_tables(self):
         """Create database tables if they don't exist."""
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS dependency_edges (
                     id SERIAL PRIMARY KEY,
@@ -48,18 +183,20 @@ class PostgresDependencyGraph:
                 CREATE INDEX IF NOT EXISTS idx_downstream
                 ON dependency_edges(downstream)
             """)
-            self.conn.commit()
+            self._track_version(cur, "dependency_edges")
 
     def register_dependent(
         self, upstream: str, downstream: str, constraint: str = "", **metadata
     ):
         """Register a new dependent package."""
-        with self.conn.cursor() as cur:
-            cur.execute(
+        with self._cursor() as cur:
+            self._execute_prepared(
+                cur,
+                "wary_register_dependent",
                 """
                 INSERT INTO dependency_edges
                 (upstream, downstream, constraint_spec, registered_at, risk_score, metadata)
-                VALUES (%s, %s, %s, NOW(), %s, %s)
+                VALUES ($1, $2, $3, NOW(), $4, $5)
                 ON CONFLICT (upstream, downstream)
                 DO UPDATE SET
                     constraint_spec = EXCLUDED.constraint_spec,
@@ -74,74 +211,73 @@ class PostgresDependencyGraph:
                     json.dumps(metadata),
                 ),
             )
-            self.conn.commit()
 
     def get_dependents(self, upstream: str) -> list[dict]:
         """Get all packages that depend on upstream."""
-        with self.conn.cursor() as cur:
+        with self._cursor(dict_rows=True) as cur:
             cur.execute(
-                """
-                SELECT downstream, constraint_spec, risk_score, metadata, registered_at
+                f"""
+                SELECT {self._EDGE_COLUMNS}
                 FROM dependency_edges
                 WHERE upstream = %s
             """,
                 (upstream,),
             )
-
-            return [
-                {
-                    'upstream': upstream,
-                    'downstream': row[0],
-                    'constraint': row[1],
-                    'risk_score': row[2],
-                    'metadata': row[3],
-                    'registered_at': row[4],
-                }
-                for row in cur.fetchall()
-            ]
+            return cur.fetchall()
 
     def get_all_edges(self) -> list[dict]:
         """Get all dependency edges."""
-        with self.conn.cursor() as cur:
-            cur.execute("""
-                SELECT upstream, downstream, constraint_spec, risk_score, metadata, registered_at
-                FROM dependency_edges
-            """)
+        with self._cursor(dict_rows=True) as cur:
+            cur.execute(f"SELECT {self._EDGE_COLUMNS} FROM dependency_edges")
+            return cur.fetchall()
+
+    def dependent_counts(self) -> Counter:
+        """Count dependents per upstream package (e.g. ``.most_common(10)``)."""
+        with self._cursor() as cur:
+            cur.execute("SELECT upstream, COUNT(*) FROM dependency_edges GROUP BY upstream")
+            return Counter(dict(cur.fetchall()))
 
-            return [
-                {
-                    'upstream': row[0],
-                    'downstream': row[1],
-                    'constraint': row[2],
-                    'risk_score': row[3],
-                    'metadata': row[4],
-                    'registered_at': row[5],
-                }
-                for row in cur.fetchall()
-            ]
+    def data_version(self) -> tuple:
+        """A token that changes when edges change (see `_table_version`)."""
+        return self._table_version("dependency_edges")
 
     def __len__(self) -> int:
         """Get total number of edges."""
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("SELECT COUNT(*) FROM dependency_edges")
             return cur.fetchone()[0]
 
 
-class PostgresResultsLedger:
+class PostgresResultsLedger(_PostgresStore):
     """Test results backed by PostgreSQL."""
 
-    def __init__(self, connection_string: str):
-        try:
-            import psycopg2
-        except ImportError:
-            raise ImportError("psycopg2 is required for PostgreSQL storage. Install with: pip install psycopg2-binary")
-
-        self.conn = psycopg2.connect(connection_string)
-        self._create_tables()
+    # Static filters (a NULL parameter disables its condition), so every filter
+    # combination runs the same SQL text. (psycopg2 interpolates parameters
+    # client-side, so the server still plans each query afresh.)
+    _FILTERS = """
+        (upstream_package = %s OR %s::text IS NULL)
+        AND (upstream_version = %s OR %s::text IS NULL)
+        AND (downstream_package = %s OR %s::text IS NULL)
+        AND (status = %s OR %s::text IS NULL)
+    """
+    _QUERY_TEMPLATE = """
+        SELECT test_id, upstream_package, upstream_version, downstream_package,
+               downstream_version, test_command, commit_hash, status,
+               started_at, finished_at, exit_code, environment{output_column}
+        FROM test_results
+        WHERE {filters}
+        ORDER BY started_at DESC
+        LIMIT %s OFFSET %s
+    """
+    _QUERY = _QUERY_TEMPLATE.format(output_column="", filters=_FILTERS)
+    _QUERY_WITH_OUTPUT = _QUERY_TEMPLATE.format(output_column=", output", filters=_FILTERS)
+    _QUERY_WITH_TRUNCATED_OUTPUT = _QUERY_TEMPLATE.format(
+        output_column=", LEFT(output, %s) AS output", filters=_FILTERS
+    )
 
     def _create_tables(self):
         """Create database tables if they don't exist."""
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS test_results (
                     test_id VARCHAR(36) PRIMARY KEY,
@@ -159,56 +295,125 @@ class PostgresResultsLedger:
                     environment JSONB
                 )
             """)
+            # Serve the filtered, newest-first queries without a sort step
             cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_upstream
-                ON test_results(upstream_package)
+                CREATE INDEX IF NOT EXISTS idx_tr_upstream_status_started
+                ON test_results(upstream_package, status, started_at DESC)
             """)
             cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_downstream
-                ON test_results(downstream_package)
+                CREATE INDEX IF NOT EXISTS idx_tr_failures
+                ON test_results(upstream_package, started_at DESC)
+                WHERE status = 'fail'
             """)
             cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_status
-                ON test_results(status)
+                CREATE INDEX IF NOT EXISTS idx_tr_downstream_started
+                ON test_results(downstream_package, started_at DESC)
             """)
             cur.execute("""
                 CREATE INDEX IF NOT EXISTS idx_started_at
                 ON test_results(started_at DESC)
             """)
-            self.conn.commit()
+            # Superseded by the composite indexes. (Older versions also asked for
+            # idx_upstream/idx_downstream here, but those names are taken by
+            # dependency_edges' indexes, so don't drop them.)
+            cur.execute("DROP INDEX IF EXISTS idx_status")
+            # Per (upstream, downstream, status) counts, so stats don't scan
+            # test_results. Keys are coalesced to '' since the unique index
+            # that REFRESH ... CONCURRENTLY requires can't tell NULLs apart.
+            cur.execute("""
+                CREATE MATERIALIZED VIEW IF NOT EXISTS wary_stats AS
+                SELECT COALESCE(upstream_package, '') AS upstream_package,
+                       COALESCE(downstream_package, '') AS downstream_package,
+                       COALESCE(status, '') AS status,
+                       COUNT(*) AS n,
+                       MAX(started_at) AS last_run
+                FROM test_results
+                GROUP BY 1, 2, 3
+            """)
+            cur.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_wary_stats
+                ON wary_stats(upstream_package, downstream_package, status)
+            """)
+            self._track_version(cur, "test_results")
+
+    @staticmethod
+    def _row(result: dict) -> tuple:
+        return (
+            result['test_id'],
+            result['upstream_package'],
+            result['upstream_version'],
+            result['downstream_package'],
+            result['downstream_version'],
+            result['test_command'],
+            result['commit_hash'],
+            result['status'],
+            result['started_at'],
+            result['finished_at'],
+            result['output'],
+            result['exit_code'],
+            json.dumps(result.get('environment', {})),
+        )
 
     def add_result(self, result: dict):
         """Add a test result."""
-        with self.conn.cursor() as cur:
-            cur.execute(
+        with self._cursor() as cur:
+            self._execute_prepared(
+                cur,
+                "wary_add_result",
                 """
                 INSERT INTO test_results
                 (test_id, upstream_package, upstream_version, downstream_package,
                  downstream_version, test_command, commit_hash, status,
                  started_at, finished_at, output, exit_code, environment)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
             """,
-                (
-                    result['test_id'],
-                    result['upstream_package'],
-                    result['upstream_version'],
-                    result['downstream_package'],
-                    result['downstream_version'],
-                    result['test_command'],
-                    result['commit_hash'],
-                    result['status'],
-                    result['started_at'],
-                    result['finished_at'],
-                    result['output'],
-                    result['exit_code'],
-                    json.dumps(result.get('environment', {})),
-                ),
+                self._row(result),
             )
-            self.conn.commit()
+
+    def add_results_bulk(self, results: list[dict]):
+        """Add many test results in one statement (per 500) and one commit."""
+        from psycopg2.extras import execute_values
+
+        with self._cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO test_results
+                (test_id, upstream_package, upstream_version, downstream_package,
+                 downstream_version, test_command, commit_hash, status,
+                 started_at, finished_at, output, exit_code, environment)
+                VALUES %s
+            """,
+                [self._row(result) for result in results],
+                page_size=500,
+            )
+        self.refresh_stats()
+
+    def refresh_stats(self):
+        """Recompute the ``wary_stats`` view (without blocking its readers).
+
+        Done after each `add_results_bulk`; results added one by one with
+        `add_result` show in `get_stats` from the next refresh (`status_counts`
+        doesn't use the view).
+        """
+        with self._cursor() as cur:
+            cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY wary_stats")
+
+    def get_stats(self) -> list[dict]:
+        """Result counts and last run time per (upstream, downstream, status).
+
+        Read from the ``wary_stats`` view, as of the last `refresh_stats`.
+        """
+        with self._cursor(dict_rows=True) as cur:
+            cur.execute("""
+                SELECT upstream_package, downstream_package, status, n, last_run
+                FROM wary_stats
+            """)
+            return cur.fetchall()
 
     def __getitem__(self, test_id: str) -> dict:
         """Get a specific test result."""
-        with self.conn.cursor() as cur:
+        with self._cursor(dict_rows=True) as cur:
             cur.execute(
                 """
                 SELECT test_id, upstream_package, upstream_version, downstream_package,
@@ -223,22 +428,15 @@ class PostgresResultsLedger:
             row = cur.fetchone()
             if not row:
                 raise KeyError(test_id)
+            return self._with_iso_times(row)
 
-            return {
-                'test_id': row[0],
-                'upstream_package': row[1],
-                'upstream_version': row[2],
-                'downstream_package': row[3],
-                'downstream_version': row[4],
-                'test_command': row[5],
-                'commit_hash': row[6],
-                'status': row[7],
-                'started_at': row[8].isoformat() if row[8] else None,
-                'finished_at': row[9].isoformat() if row[9] else None,
-                'output': row[10],
-                'exit_code': row[11],
-                'environment': row[12],
-            }
+    @staticmethod
+    def _with_iso_times(row: dict) -> dict:
+        """Turn a row's timestamps into ISO strings, as in the file-based ledger."""
+        for key in ('started_at', 'finished_at'):
+            if row[key] is not None:
+                row[key] = row[key].isoformat()
+        return row
 
     def query_results(
         self,
@@ -246,59 +444,596 @@ class PostgresResultsLedger:
         downstream_package: Optional[str] = None,
         status: Optional[str] = None,
         limit: int = 1000,
+        upstream_version: Optional[str] = None,
+        output_limit: Optional[int] = None,
+        include_output: bool = False,
+        offset: int = 0,
     ) -> list[dict]:
-        """Query results with filters."""
-        conditions = []
-        params = []
+        """Query results with filters, newest first.
 
-        if upstream_package:
-            conditions.append("upstream_package = %s")
-            params.append(upstream_package)
-        if downstream_package:
-            conditions.append("downstream_package = %s")
-            params.append(downstream_package)
-        if status:
-            conditions.append("status = %s")
-            params.append(status)
+        ``output`` (possibly large) is only fetched if ``include_output`` is
+        true or ``output_limit`` is given, in which case it is truncated in the
+        database; otherwise use `get_output`. ``limit`` and ``offset`` page
+        through the results.
+        """
+        params = self._filter_params(
+            upstream_package=upstream_package,
+            downstream_package=downstream_package,
+            status=status,
+            upstream_version=upstream_version,
+        )
+
+        if output_limit is not None:
+            query = self._QUERY_WITH_TRUNCATED_OUTPUT
+            params = (output_limit, *params)
+        elif include_output:
+            query = self._QUERY_WITH_OUTPUT
+        else:
+            query = self._QUERY
 
-        where_clause = " AND ".join(conditions) if conditions else "TRUE"
-        params.append(limit)
+        with self._cursor(dict_rows=True) as cur:
+            cur.execute(query, (*params, limit, offset))
+            return [self._with_iso_times(row) for row in cur.fetchall()]
 
-        with self.conn.cursor() as cur:
+    def get_output(self, test_id: str) -> str:
+        """Get the output of a test result."""
+        with self._cursor() as cur:
+            cur.execute("SELECT output FROM test_results WHERE test_id = %s", (test_id,))
+            row = cur.fetchone()
+            if not row:
+                raise KeyError(test_id)
+            return row[0]
+
+    def has_results(
+        self,
+        upstream_package: Optional[str] = None,
+        downstream_package: Optional[str] = None,
+        status: Optional[str] = None,
+        upstream_version: Optional[str] = None,
+    ) -> bool:
+        """Check whether any result matches the filters."""
+        params = self._filter_params(
+            upstream_package=upstream_package,
+            downstream_package=downstream_package,
+            status=status,
+            upstream_version=upstream_version,
+        )
+
+        with self._cursor() as cur:
             cur.execute(
-                f"""
-                SELECT test_id, upstream_package, upstream_version, downstream_package,
-                       downstream_version, test_command, commit_hash, status,
-                       started_at, finished_at, output, exit_code, environment
-                FROM test_results
-                WHERE {where_clause}
-                ORDER BY started_at DESC
-                LIMIT %s
-            """,
-                params,
+                f"SELECT 1 FROM test_results WHERE {self._FILTERS} LIMIT 1", params
             )
+            return cur.fetchone() is not None
+
+    @staticmethod
+    def _filter_params(
+        upstream_package=None, downstream_package=None, status=None, upstream_version=None
+    ) -> tuple:
+        """Parameters for `_FILTERS`; a falsy filter means "don't filter"."""
+        params = ()
+        for value in (upstream_package, upstream_version, downstream_package, status):
+            value = value or None
+            params += (value, value)
+        return params
 
-            return [
-                {
-                    'test_id': row[0],
-                    'upstream_package': row[1],
-                    'upstream_version': row[2],
-                    'downstream_package': row[3],
-                    'downstream_version': row[4],
-                    'test_command': row[5],
-                    'commit_hash': row[6],
-                    'status': row[7],
-                    'started_at': row[8].isoformat() if row[8] else None,
-                    'finished_at': row[9].isoformat() if row[9] else None,
-                    'output': row[10],
-                    'exit_code': row[11],
-                    'environment': row[12],
-                }
-                for row in cur.fetchall()
-            ]
+    def status_counts(self, upstream_package: Optional[str] = None) -> Counter:
+        """Count results (of ``upstream_package``, if given) by status.
+
+        Counted from ``test_results`` itself (not the ``wary_stats`` view), so
+        results added with `add_result` are counted right away.
+        """
+        with self._cursor() as cur:
+            if upstream_package:
+                # Counted off idx_tr_upstream_status_started
+                cur.execute(
+                    """
+                    SELECT status, COUNT(*) FROM test_results
+                    WHERE upstream_package = %s
+                    GROUP BY status
+                """,
+                    (upstream_package,),
+                )
+            else:
+                cur.execute("SELECT status, COUNT(*) FROM test_results GROUP BY status")
+            return Counter(dict(cur.fetchall()))
 
     def __len__(self) -> int:
         """Get total number of test results."""
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("SELECT COUNT(*) FROM test_results")
             return cur.fetchone()[0]
+
+    def data_version(self) -> tuple:
+        """A token that changes when results change (see `_table_version`)."""
+        return self._table_version("test_results")
+
+
+def _default_sqlite_path() -> Path:
+    import appdirs
+
+    return Path(appdirs.user_data_dir("wary")) / "wary.db"
+
+
+def _connect_sqlite(db_path) -> sqlite3.Connection:
+    """Open an autocommit SQLite connection that can be shared across threads."""
+    db_path = Path(db_path) if db_path is not None else _default_sqlite_path()
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _track_sqlite_version(conn: sqlite3.Connection, table: str):
+    """Keep a version of ``table`` in ``wary_versions``, bumped by triggers.
+
+    The version lives in the database, so it is the same for every connection
+    (e.g. each gunicorn worker's) and counts writes made by any of them. Its
+    random ``epoch`` tells a recreated database apart from the old one.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS wary_versions (
+            name TEXT PRIMARY KEY,
+            epoch TEXT NOT NULL,
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute(
+        "INSERT OR IGNORE INTO wary_versions VALUES (?, hex(randomblob(8)), 0)",
+        (table,),
+    )
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE wary_versions SET version = version + 1 WHERE name = '{table}';
+            END
+        """)
+
+
+def _sqlite_table_version(conn: sqlite3.Connection, table: str) -> tuple:
+    """The ``(epoch, version)`` of ``table`` (see `_track_sqlite_version`)."""
+    return conn.execute(
+        "SELECT epoch, version FROM wary_versions WHERE name = ?", (table,)
+    ).fetchone()
+
+
+def _sqlite_timestamp(value) -> Optional[str]:
+    """ISO text for a datetime (or its string form), so it sorts chronologically."""
+    if value is None:
+        return None
+    return str(value).replace(" ", "T", 1)
+
+
+class SQLiteDependencyGraph(MutableMapping):
+    """Dependency graph backed by a local SQLite database.
+
+    Same interface as DependencyGraph (``upstream -> list of edges``), with one
+    row per edge.
+    """
+
+    _columns = "upstream, downstream, constraint_spec, registered_at, risk_score, metadata"
+
+    def __init__(self, db_path: str = None):
+        self.conn = _connect_sqlite(db_path)
+        self._lock = threading.RLock()
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create database tables if they don't exist."""
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS dependency_edges (
+                upstream TEXT NOT NULL,
+                downstream TEXT NOT NULL,
+                constraint_spec TEXT,
+                registered_at TEXT,
+                risk_score REAL,
+                metadata TEXT,
+                PRIMARY KEY (upstream, downstream)
+            )
+        """)
+        self.conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_edges_downstream
+            ON dependency_edges(downstream)
+        """)
+        _track_sqlite_version(self.conn, "dependency_edges")
+
+    @staticmethod
+    def _edge(row) -> dict:
+        return {
+            'upstream': row[0],
+            'downstream': row[1],
+            'constraint': row[2],
+            'registered_at': row[3],
+            'risk_score': row[4],
+            'metadata': json_loads(row[5]) if row[5] else {},
+        }
+
+    @staticmethod
+    def _row(edge: dict) -> tuple:
+        return (
+            edge['upstream'],
+            edge['downstream'],
+            edge.get('constraint', ''),
+            _sqlite_timestamp(edge.get('registered_at')),
+            edge.get('risk_score', 0.5),
+            json_dumps(edge.get('metadata', {})).decode(),
+        )
+
+    @contextmanager
+    def batch(self):
+        """Run the writes made in the block in a single transaction."""
+        with self._lock:
+            if self.conn.in_transaction:
+                yield self
+                return
+            self.conn.execute("BEGIN")
+            try:
+                yield self
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def flush(self):
+        """No-op: writes go straight to the database."""
+
+    def __getitem__(self, upstream_pkg: str) -> list[dict]:
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {self._columns} FROM dependency_edges WHERE upstream = ? ORDER BY rowid",
+                (upstream_pkg,),
+            ).fetchall()
+        return [self._edge(row) for row in rows]
+
+    def __setitem__(self, upstream_pkg: str, edges: list[dict]):
+        rows = [self._row({**edge, 'upstream': upstream_pkg}) for edge in edges]
+        with self.batch():
+            self.conn.execute("DELETE FROM dependency_edges WHERE upstream = ?", (upstream_pkg,))
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO dependency_edges ({self._columns}) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def __delitem__(self, upstream_pkg: str):
+        with self._lock:
+            cur = self.conn.execute(
+                "DELETE FROM dependency_edges WHERE upstream = ?", (upstream_pkg,)
+            )
+        if cur.rowcount == 0:
+            raise KeyError(upstream_pkg)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT upstream FROM dependency_edges ORDER BY upstream"
+            ).fetchall()
+        return (row[0] for row in rows)
+
+    def __len__(self) -> int:
+        """Get number of upstream packages."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(DISTINCT upstream) FROM dependency_edges"
+            ).fetchone()[0]
+
+    def register_dependent(
+        self,
+        upstream: str,
+        downstream: str,
+        constraint: str = "",
+        test_command: str = "pytest",
+        contact: str = "",
+        **metadata,
+    ):
+        """Register a new dependent package."""
+        edge = {
+            'upstream': upstream,
+            'downstream': downstream,
+            'constraint': constraint,
+            'registered_at': datetime.now(),
+            'risk_score': 0.5,
+            'metadata': {'test_command': test_command, 'contact': contact, **metadata},
+        }
+        # One transaction, so the edge is never missing, even if the insert fails
+        with self.batch():
+            # Delete first so an update moves to the end, like DependencyGraph
+            self.conn.execute(
+                "DELETE FROM dependency_edges WHERE upstream = ? AND downstream = ?",
+                (upstream, downstream),
+            )
+            self.conn.execute(
+                f"INSERT INTO dependency_edges ({self._columns}) VALUES (?, ?, ?, ?, ?, ?)",
+                self._row(edge),
+            )
+
+    def get_dependents(self, upstream: str) -> list[dict]:
+        """Get all packages that depend on upstream."""
+        return self[upstream]
+
+    def get_all_edges(self) -> list[dict]:
+        """Get all dependency edges."""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {self._columns} FROM dependency_edges ORDER BY rowid"
+            ).fetchall()
+        return [self._edge(row) for row in rows]
+
+    def dependent_counts(self) -> Counter:
+        """Count dependents per upstream package (e.g. ``.most_common(10)``)."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT upstream, COUNT(*) FROM dependency_edges GROUP BY upstream"
+            ).fetchall()
+        return Counter(dict(rows))
+
+    def data_version(self) -> tuple:
+        """A token that changes whenever edges change, whoever changes them."""
+        with self._lock:
+            return _sqlite_table_version(self.conn, "dependency_edges")
+
+
+class SQLiteResultsLedger(MutableMapping):
+    """Test results backed by a local SQLite database.
+
+    Same interface as ResultsLedger (``test_id -> result``). Queries return the
+    newest results first.
+    """
+
+    _columns = (
+        "test_id, upstream_package, upstream_version, downstream_package, "
+        "downstream_version, test_command, commit_hash, status, "
+        "started_at, finished_at, output, exit_code, environment"
+    )
+
+    def __init__(self, db_path: str = None):
+        self.conn = _connect_sqlite(db_path)
+        self._lock = threading.RLock()
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create database tables if they don't exist."""
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS test_results (
+                test_id TEXT PRIMARY KEY,
+                upstream_package TEXT,
+                upstream_version TEXT,
+                downstream_package TEXT,
+                downstream_version TEXT,
+                test_command TEXT,
+                commit_hash TEXT,
+                status TEXT,
+                started_at TEXT,
+                finished_at TEXT,
+                output TEXT,
+                exit_code INTEGER,
+                environment TEXT
+            )
+        """)
+        for column in ("upstream_package", "downstream_package", "status", "started_at"):
+            self.conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_results_{column}
+                ON test_results({column})
+            """)
+        _track_sqlite_version(self.conn, "test_results")
+
+    @staticmethod
+    def _result(row) -> dict:
+        return {
+            'test_id': row[0],
+            'upstream_package': row[1],
+            'upstream_version': row[2],
+            'downstream_package': row[3],
+            'downstream_version': row[4],
+            'test_command': row[5],
+            'commit_hash': row[6],
+            'status': row[7],
+            'started_at': row[8],
+            'finished_at': row[9],
+            'output': row[10],
+            'exit_code': row[11],
+            'environment': json_loads(row[12]) if row[12] else {},
+        }
+
+    def __getitem__(self, test_id: str) -> dict:
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {self._columns} FROM test_results WHERE test_id = ?", (test_id,)
+            ).fetchone()
+        if not row:
+            raise KeyError(test_id)
+        return self._result(row)
+
+    @staticmethod
+    def _row(test_id: str, result: dict) -> tuple:
+        return (
+            test_id,
+            result['upstream_package'],
+            result['upstream_version'],
+            result['downstream_package'],
+            result['downstream_version'],
+            result['test_command'],
+            result['commit_hash'],
+            result['status'],
+            _sqlite_timestamp(result['started_at']),
+            _sqlite_timestamp(result['finished_at']),
+            result['output'],
+            result['exit_code'],
+            json_dumps(result.get('environment', {})).decode(),
+        )
+
+    def __setitem__(self, test_id: str, result: dict):
+        row = self._row(test_id, result)
+        with self._lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO test_results ({self._columns}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+
+    def __delitem__(self, test_id: str):
+        with self._lock:
+            cur = self.conn.execute("DELETE FROM test_results WHERE test_id = ?", (test_id,))
+        if cur.rowcount == 0:
+            raise KeyError(test_id)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            rows = self.conn.execute("SELECT test_id FROM test_results").fetchall()
+        return (row[0] for row in rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM test_results").fetchone()[0]
+
+    def data_version(self) -> tuple:
+        """A token that changes whenever results change, whoever changes them."""
+        with self._lock:
+            return _sqlite_table_version(self.conn, "test_results")
+
+    def add_result(self, result: dict):
+        """Add a test result."""
+        self[result['test_id']] = result
+
+    def add_results_bulk(self, results: list[dict]):
+        """Add many test results in one transaction."""
+        rows = [self._row(result['test_id'], result) for result in results]
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO test_results ({self._columns}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def iter_results(
+        self,
+        upstream_package: Optional[str] = None,
+        downstream_package: Optional[str] = None,
+        status: Optional[str] = None,
+        after: Optional[datetime] = None,
+        upstream_version: Optional[str] = None,
+        output_limit: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Yield results matching the filters, newest first (at most ``limit``).
+
+        If ``output_limit`` is given, ``output`` is truncated in the database.
+        """
+        where_clause, params = self._where_clause(
+            upstream_package=upstream_package,
+            downstream_package=downstream_package,
+            status=status,
+            after=after,
+            upstream_version=upstream_version,
+        )
+        columns = self._columns
+        if output_limit is not None:
+            columns = columns.replace(" output,", " substr(output, 1, ?),")
+            params.insert(0, output_limit)
+        # LIMIT -1 is no limit
+        params.append(-1 if limit is None else limit)
+
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {columns} FROM test_results WHERE {where_clause} "
+                "ORDER BY started_at DESC LIMIT ?",
+                params,
+            ).fetchall()
+        return map(self._result, rows)
+
+    def query_results(
+        self,
+        upstream_package: Optional[str] = None,
+        downstream_package: Optional[str] = None,
+        status: Optional[str] = None,
+        after: Optional[datetime] = None,
+        upstream_version: Optional[str] = None,
+        output_limit: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> list[dict]:
+        """Query results with filters, newest first (at most ``limit`` of them)."""
+        return list(
+            self.iter_results(
+                upstream_package=upstream_package,
+                downstream_package=downstream_package,
+                status=status,
+                after=after,
+                upstream_version=upstream_version,
+                output_limit=output_limit,
+                limit=limit,
+            )
+        )
+
+    def has_results(self, **filters) -> bool:
+        """Check whether any result matches the filters (those of `query_results`)."""
+        # Options of query_results that don't filter
+        filters.pop("output_limit", None)
+        filters.pop("limit", None)
+        where_clause, params = self._where_clause(**filters)
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT 1 FROM test_results WHERE {where_clause} LIMIT 1", params
+            ).fetchone()
+        return row is not None
+
+    def status_counts(self, upstream_package: Optional[str] = None) -> Counter:
+        """Count results (of ``upstream_package``, if given) by status."""
+        where_clause, params = self._where_clause(upstream_package=upstream_package)
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT status, COUNT(*) FROM test_results WHERE {where_clause} "
+                "GROUP BY status",
+                params,
+            ).fetchall()
+        return Counter(dict(rows))
+
+    def get_latest_result(
+        self, upstream_package: str, downstream_package: str
+    ) -> Optional[dict]:
+        """Get most recent result for package pair."""
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {self._columns} FROM test_results "
+                "WHERE upstream_package = ? AND downstream_package = ? "
+                "ORDER BY started_at DESC LIMIT 1",
+                (upstream_package, downstream_package),
+            ).fetchone()
+        return self._result(row) if row else None
+
+    @staticmethod
+    def _where_clause(
+        upstream_package=None,
+        downstream_package=None,
+        status=None,
+        after=None,
+        upstream_version=None,
+    ) -> tuple[str, list]:
+        """Build a WHERE clause and its parameters from query filters."""
+        conditions = []
+        params = []
+
+        if upstream_package:
+            conditions.append("upstream_package = ?")
+            params.append(upstream_package)
+        if upstream_version:
+            conditions.append("upstream_version = ?")
+            params.append(upstream_version)
+        if downstream_package:
+            conditions.append("downstream_package = ?")
+            params.append(downstream_package)
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if after:
+            conditions.append("started_at >= ?")
+            params.append(_sqlite_timestamp(after))
+
+        where_clause = " AND ".join(conditions) if conditions else "1"
+        return where_clause, params
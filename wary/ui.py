@@ -4,16 +4,23 @@ This module provides a web dashboard for viewing dependency graphs,
 test results, and statistics.
 """
 
-from flask import Flask, render_template_string, request, redirect, url_for
+from flask import Flask, Response, g, render_template_string, request, redirect, url_for
 from datetime import datetime
+from functools import lru_cache
+import hashlib
+from markupsafe import Markup
 
-from wary.graph import DependencyGraph
-from wary.ledger import ResultsLedger
+from wary import __version__
+
+# The stores are shared with the API (one instance each per process, opened on
+# first use, and configured the same way)
+from wary.api import get_graph, get_ledger
 from wary.watcher import VersionWatcher
 from wary.my_uf import (
     Page,
     Component,
     ComponentType,
+    PreformattedCard,
     make_table,
     make_stats,
     make_card,
@@ -21,6 +28,127 @@ from wary.my_uf import (
 )
 
 
+# Badge (label, color) per result status; others are shown in red, upper-cased
+_STATUS_DISPLAY = {
+    'pass': ('PASS', 'green'),
+    'fail': ('FAIL', 'red'),
+    'error': ('ERROR', 'red'),
+}
+
+
+@lru_cache(maxsize=16)
+def _status_badge(status: str) -> Markup:
+    """Badge HTML for a result status.
+
+    There are only a handful of statuses, so each badge is rendered once.
+    """
+    label, color = _STATUS_DISPLAY.get(status) or (status.upper(), 'red')
+    return make_badge(label, color).to_html()
+
+
+def _display_time(timestamp) -> str:
+    """A result timestamp to the second (``YYYY-MM-DD HH:MM:SS``), or 'N/A'."""
+    return str(timestamp)[:19] if timestamp else 'N/A'
+
+
+# Table rows, built as one tuple per result (or edge)
+
+
+def _result_row(r: dict) -> tuple:
+    return (
+        r['upstream_package'],
+        r['downstream_package'],
+        r['upstream_version'],
+        _status_badge(r['status']),
+        _display_time(r.get('started_at')),
+    )
+
+
+def _result_row_with_id(r: dict) -> tuple:
+    return (*_result_row(r), r['test_id'][:8] + '...')
+
+
+def _history_row(r: dict) -> tuple:
+    return (
+        r['downstream_package'],
+        r['upstream_version'],
+        _status_badge(r['status']),
+        _display_time(r.get('started_at')),
+    )
+
+
+def _dependent_row(d: dict) -> tuple:
+    metadata = d.get('metadata') or {}
+    return (d['downstream'], d.get('constraint', ''), metadata.get('test_command', 'N/A'))
+
+
+# format escapes the values (but not the status badge, already Markup)
+_RESULT_INFO_HTML = Markup("""
+    <p><strong>Test ID:</strong> {test_id}</p>
+    <p><strong>Upstream:</strong> {upstream_package}@{upstream_version}</p>
+    <p><strong>Downstream:</strong> {downstream_package}@{downstream_version}</p>
+    <p><strong>Status:</strong> {status_badge}</p>
+    <p><strong>Test Command:</strong> {test_command}</p>
+    <p><strong>Started:</strong> {started_at}</p>
+    <p><strong>Finished:</strong> {finished_at}</p>
+    <p><strong>Exit Code:</strong> {exit_code}</p>
+    """)
+
+
+@lru_cache(maxsize=1)
+def _register_form_html() -> str:
+    """The registration page, which is the same for every request."""
+    components = [
+        Component(
+            type=ComponentType.HEADING,
+            content='Register Dependent Package',
+            props={'level': 1},
+        ),
+        Component(
+            type=ComponentType.TEXT,
+            content='Register your package as dependent of an upstream package.',
+        ),
+        Component(
+            type=ComponentType.TEXT,
+            content=Markup("""
+            <form method="POST" action="/register">
+                <div style="margin: 10px 0;">
+                    <label>Upstream Package:</label><br>
+                    <input type="text" name="upstream" required style="width: 300px; padding: 8px;">
+                </div>
+                <div style="margin: 10px 0;">
+                    <label>Your Package (Downstream):</label><br>
+                    <input type="text" name="downstream" required style="width: 300px; padding: 8px;">
+                </div>
+                <div style="margin: 10px 0;">
+                    <label>Version Constraint:</label><br>
+                    <input type="text" name="constraint" placeholder=">=1.0.0" style="width: 300px; padding: 8px;">
+                </div>
+                <div style="margin: 10px 0;">
+                    <label>Test Command:</label><br>
+                    <input type="text" name="test_command" value="pytest" style="width: 300px; padding: 8px;">
+                </div>
+                <div style="margin: 10px 0;">
+                    <label>Contact Email:</label><br>
+                    <input type="email" name="contact" style="width: 300px; padding: 8px;">
+                </div>
+                <div style="margin: 20px 0;">
+                    <button type="submit" style="padding: 10px 20px; background-color: #007bff; color: white; border: none; border-radius: 4px; cursor: pointer;">
+                        Register
+                    </button>
+                </div>
+            </form>
+            """),
+        ),
+    ]
+
+    return Page(title='Register - Wary', components=components).to_html()
+
+
+# Endpoints whose pages only depend on the URL and the stores' data
+_DATA_PAGES = {'home', 'package_details', 'results_list', 'result_detail'}
+
+
 def create_ui_app(config=None):
     """Create Flask app for the web UI.
 
@@ -35,30 +163,52 @@ def create_ui_app(config=None):
     if config:
         app.config.update(config)
 
+    # The data pages only change when the stores do: their ETag is derived from
+    # the stores' data versions, so a matching If-None-Match is answered with a
+    # 304 before anything is queried or rendered.
+    @app.before_request
+    def not_modified():
+        if request.method != 'GET' or request.endpoint not in _DATA_PAGES:
+            return None
+        graph, ledger = get_graph(), get_ledger()
+        if not (hasattr(graph, 'data_version') and hasattr(ledger, 'data_version')):
+            return None
+        key = repr((__version__, request.full_path, graph.data_version(), ledger.data_version()))
+        g.page_etag = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        if request.if_none_match.contains_weak(g.page_etag):
+            return Response(status=304)
+        return None
+
+    @app.after_request
+    def set_page_etag(response):
+        etag = g.get('page_etag')
+        if etag and response.status_code in (200, 304):
+            response.set_etag(etag, weak=True)
+            response.headers.setdefault('Cache-Control', 'no-cache')
+        return response
+
     @app.route('/')
     def home():
         """Home page with dashboard."""
-        graph = DependencyGraph()
-        ledger = ResultsLedger()
+        graph = get_graph()
+        ledger = get_ledger()
 
         # Get stats
-        all_edges = graph.get_all_edges()
-        all_results = list(ledger.query_results())
+        dependent_counts = graph.dependent_counts()
+        status_counts = ledger.status_counts()
+        total_tests = sum(status_counts.values())
 
         stats = [
-            {'label': 'Registered Dependencies', 'value': len(all_edges)},
-            {'label': 'Total Tests', 'value': len(all_results)},
+            {'label': 'Registered Dependencies', 'value': sum(dependent_counts.values())},
+            {'label': 'Total Tests', 'value': total_tests},
         ]
 
-        if all_results:
-            passed = sum(1 for r in all_results if r['status'] == 'pass')
-            stats.append({'label': 'Pass Rate', 'value': f"{passed/len(all_results)*100:.1f}%"})
+        if total_tests:
+            passed = status_counts['pass']
+            stats.append({'label': 'Pass Rate', 'value': f"{passed/total_tests*100:.1f}%"})
 
-        # Recent failures
-        recent_failures = ledger.query_results(status='fail')
-        recent_failures = sorted(
-            recent_failures, key=lambda r: r.get('started_at', ''), reverse=True
-        )[:10]
+        # Recent failures (the ledger returns the newest first)
+        recent_failures = ledger.query_results(status='fail', limit=10)
 
         # Build page
         components = [
@@ -68,18 +218,7 @@ def create_ui_app(config=None):
         ]
 
         if recent_failures:
-            failure_rows = []
-            for r in recent_failures:
-                status_badge = make_badge('FAIL', 'red')
-                failure_rows.append(
-                    [
-                        r['upstream_package'],
-                        r['downstream_package'],
-                        r['upstream_version'],
-                        status_badge.to_html(),
-                        r.get('started_at', 'N/A')[:19],
-                    ]
-                )
+            failure_rows = list(map(_result_row, recent_failures))
 
             components.append(
                 make_table(
@@ -91,25 +230,14 @@ def create_ui_app(config=None):
             components.append(Component(type=ComponentType.TEXT, content='No recent failures'))
 
         # Upstream packages
-        upstream_packages = {}
-        for edge in all_edges:
-            upstream = edge['upstream']
-            if upstream not in upstream_packages:
-                upstream_packages[upstream] = 0
-            upstream_packages[upstream] += 1
-
-        if upstream_packages:
+        if dependent_counts:
             components.append(
                 Component(
                     type=ComponentType.HEADING, content='Top Upstream Packages', props={'level': 2}
                 )
             )
 
-            top_packages = sorted(
-                upstream_packages.items(), key=lambda x: x[1], reverse=True
-            )[:10]
-
-            package_rows = [[pkg, count] for pkg, count in top_packages]
+            package_rows = [[pkg, count] for pkg, count in dependent_counts.most_common(10)]
             components.append(make_table(columns=['Package', 'Dependents'], rows=package_rows))
 
         page = Page(title='Wary Dashboard', components=components)
@@ -118,27 +246,29 @@ def create_ui_app(config=None):
     @app.route('/package/<package_name>')
     def package_details(package_name):
         """Details for a specific package."""
-        graph = DependencyGraph()
-        ledger = ResultsLedger()
+        graph = get_graph()
+        ledger = get_ledger()
 
         # Get dependents
         dependents = graph.get_dependents(package_name)
 
         # Get test results
-        results = ledger.query_results(upstream_package=package_name)
+        status_counts = ledger.status_counts(upstream_package=package_name)
+        total_tests = sum(status_counts.values())
+        results = ledger.query_results(upstream_package=package_name, limit=20)
 
         # Calculate stats
         stats = [
             {'label': 'Dependents', 'value': len(dependents)},
-            {'label': 'Total Tests', 'value': len(results)},
+            {'label': 'Total Tests', 'value': total_tests},
         ]
 
-        if results:
-            passed = sum(1 for r in results if r['status'] == 'pass')
-            failed = sum(1 for r in results if r['status'] == 'fail')
+        if total_tests:
+            passed = status_counts['pass']
+            failed = status_counts['fail']
             stats.append({'label': 'Passed', 'value': passed})
             stats.append({'label': 'Failed', 'value': failed})
-            stats.append({'label': 'Pass Rate', 'value': f"{passed/len(results)*100:.1f}%"})
+            stats.append({'label': 'Pass Rate', 'value': f"{passed/total_tests*100:.1f}%"})
 
         # Build page
         components = [
@@ -152,15 +282,7 @@ def create_ui_app(config=None):
         ]
 
         if dependents:
-            dependent_rows = []
-            for d in dependents:
-                dependent_rows.append(
-                    [
-                        d['downstream'],
-                        d.get('constraint', ''),
-                        d.get('metadata', {}).get('test_command', 'N/A'),
-                    ]
-                )
+            dependent_rows = list(map(_dependent_row, dependents))
 
             components.append(
                 make_table(
@@ -176,21 +298,7 @@ def create_ui_app(config=None):
         components.append(Component(type=ComponentType.HEADING, content='Test History', props={'level': 2}))
 
         if results:
-            # Sort by date
-            results = sorted(results, key=lambda r: r.get('started_at', ''), reverse=True)[:20]
-
-            result_rows = []
-            for r in results:
-                status_color = 'green' if r['status'] == 'pass' else 'red'
-                status_badge = make_badge(r['status'].upper(), status_color)
-                result_rows.append(
-                    [
-                        r['downstream_package'],
-                        r['upstream_version'],
-                        status_badge.to_html(),
-                        r.get('started_at', 'N/A')[:19],
-                    ]
-                )
+            result_rows = list(map(_history_row, results))
 
             components.append(
                 make_table(
@@ -206,44 +314,30 @@ def create_ui_app(config=None):
     @app.route('/results')
     def results_list():
         """List of all test results."""
-        ledger = ResultsLedger()
+        ledger = get_ledger()
 
         # Get filters from query params
         upstream = request.args.get('upstream')
         downstream = request.args.get('downstream')
         status = request.args.get('status')
 
+        # Newest first
         results = ledger.query_results(
-            upstream_package=upstream, downstream_package=downstream, status=status
+            upstream_package=upstream, downstream_package=downstream, status=status, limit=100
         )
 
-        # Sort by date
-        results = sorted(results, key=lambda r: r.get('started_at', ''), reverse=True)[:100]
-
         # Build page
+        if upstream or downstream or status:
+            summary = f'Showing {len(results)} results (filtered)'
+        else:
+            summary = f'Showing {len(results)} most recent results'
         components = [
             Component(type=ComponentType.HEADING, content='Test Results', props={'level': 1}),
-            Component(
-                type=ComponentType.TEXT,
-                content=f'Showing {len(results)} results (filtered)' if any([upstream, downstream, status]) else f'Showing {len(results)} most recent results',
-            ),
+            Component(type=ComponentType.TEXT, content=summary),
         ]
 
         if results:
-            result_rows = []
-            for r in results:
-                status_color = 'green' if r['status'] == 'pass' else 'red'
-                status_badge = make_badge(r['status'].upper(), status_color)
-                result_rows.append(
-                    [
-                        r['upstream_package'],
-                        r['downstream_package'],
-                        r['upstream_version'],
-                        status_badge.to_html(),
-                        r.get('started_at', 'N/A')[:19],
-                        r['test_id'][:8] + '...',
-                    ]
-                )
+            result_rows = list(map(_result_row_with_id, results))
 
             components.append(
                 make_table(
@@ -260,7 +354,7 @@ def create_ui_app(config=None):
     @app.route('/result/<test_id>')
     def result_detail(test_id):
         """Detailed view of a test result."""
-        ledger = ResultsLedger()
+        ledger = get_ledger()
 
         try:
             result = ledger[test_id]
@@ -268,86 +362,41 @@ def create_ui_app(config=None):
             return '<h1>Test result not found</h1>', 404
 
         # Build page
-        status_color = 'green' if result['status'] == 'pass' else 'red'
-        status_badge = make_badge(result['status'].upper(), status_color)
-
         components = [
             Component(
                 type=ComponentType.HEADING, content='Test Result Details', props={'level': 1}
             ),
             make_card(
                 'Test Information',
-                f"""
-                <p><strong>Test ID:</strong> {result['test_id']}</p>
-                <p><strong>Upstream:</strong> {result['upstream_package']}@{result['upstream_version']}</p>
-                <p><strong>Downstream:</strong> {result['downstream_package']}@{result['downstream_version']}</p>
-                <p><strong>Status:</strong> {status_badge.to_html()}</p>
-                <p><strong>Test Command:</strong> {result['test_command']}</p>
-                <p><strong>Started:</strong> {result.get('started_at', 'N/A')}</p>
-                <p><strong>Finished:</strong> {result.get('finished_at', 'N/A')}</p>
-                <p><strong>Exit Code:</strong> {result['exit_code']}</p>
-                """,
+                _RESULT_INFO_HTML.format(
+                    test_id=result['test_id'],
+                    upstream_package=result['upstream_package'],
+                    upstream_version=result['upstream_version'],
+                    downstream_package=result['downstream_package'],
+                    downstream_version=result['downstream_version'],
+                    status_badge=_status_badge(result['status']),
+                    test_command=result['test_command'],
+                    started_at=result.get('started_at', 'N/A'),
+                    finished_at=result.get('finished_at', 'N/A'),
+                    exit_code=result['exit_code'],
+                ),
             ),
-            make_card('Test Output', f'<pre>{result.get("output", "No output")}</pre>'),
+            PreformattedCard('Test Output', result.get('output') or 'No output'),
         ]
 
         page = Page(title=f'Test {test_id[:8]} - Wary', components=components)
-        return page.to_html()
+        # Streamed, as the output can be large
+        return Response(page.iter_html(), mimetype='text/html')
 
     @app.route('/register')
     def register_form():
         """Form to register a new dependent."""
-        components = [
-            Component(
-                type=ComponentType.HEADING,
-                content='Register Dependent Package',
-                props={'level': 1},
-            ),
-            Component(
-                type=ComponentType.TEXT,
-                content='Register your package as dependent of an upstream package.',
-            ),
-            Component(
-                type=ComponentType.TEXT,
-                content="""
-                <form method="POST" action="/register">
-                    <div style="margin: 10px 0;">
-                        <label>Upstream Package:</label><br>
-                        <input type="text" name="upstream" required style="width: 300px; padding: 8px;">
-                    </div>
-                    <div style="margin: 10px 0;">
-                        <label>Your Package (Downstream):</label><br>
-                        <input type="text" name="downstream" required style="width: 300px; padding: 8px;">
-                    </div>
-                    <div style="margin: 10px 0;">
-                        <label>Version Constraint:</label><br>
-                        <input type="text" name="constraint" placeholder=">=1.0.0" style="width: 300px; padding: 8px;">
-                    </div>
-                    <div style="margin: 10px 0;">
-                        <label>Test Command:</label><br>
-                        <input type="text" name="test_command" value="pytest" style="width: 300px; padding: 8px;">
-                    </div>
-                    <div style="margin: 10px 0;">
-                        <label>Contact Email:</label><br>
-                        <input type="email" name="contact" style="width: 300px; padding: 8px;">
-                    </div>
-                    <div style="margin: 20px 0;">
-                        <button type="submit" style="padding: 10px 20px; background-color: #007bff; color: white; border: none; border-radius: 4px; cursor: pointer;">
-                            Register
-                        </button>
-                    </div>
-                </form>
-                """,
-            ),
-        ]
-
-        page = Page(title='Register - Wary', components=components)
-        return page.to_html()
+        return _register_form_html()
 
     @app.route('/register', methods=['POST'])
     def register_submit():
         """Handle registration form submission."""
-        graph = DependencyGraph()
+        graph = get_graph()
 
         upstream = request.form.get('upstream')
         downstream = request.form.get('downstream')
@@ -1,15 +1,168 @@
 """Utility functions for wary."""
 
+from contextlib import contextmanager
+from copy import deepcopy
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
-import yaml
+from typing import Any, Iterator, Optional
+import gzip
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover (Windows)
+    fcntl = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+    import json
+
+
+if orjson is not None:
+
+    def json_dumps(obj: Any) -> bytes:
+        """Serialize to JSON bytes, rendering datetimes (and other unknowns) as str."""
+        return orjson.dumps(obj, default=str)
+
+    json_loads = orjson.loads
+
+else:
+
+    def json_dumps(obj: Any) -> bytes:
+        """Serialize to JSON bytes, rendering datetimes (and other unknowns) as str."""
+        # Same compact, UTF-8 output as orjson, so raw-bytes matching works on both
+        return json.dumps(
+            obj, default=str, separators=(',', ':'), ensure_ascii=False
+        ).encode('utf-8')
+
+    json_loads = json.loads
+
+
+logger = logging.getLogger(__name__)
+
+
+# Stored blobs smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = 1024
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+@lru_cache(maxsize=1)
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def compress_bytes(data: bytes) -> bytes:
+    """Compress a stored blob with zstd if installed, else gzip."""
+    zstd = _zstd()
+    if zstd is None:
+        return gzip.compress(data, compresslevel=6)
+    return zstd.ZstdCompressor(level=3).compress(data)
+
+
+def decompress_bytes(data: bytes) -> bytes:
+    """Undo `compress_bytes`, passing uncompressed (JSON) data through as is."""
+    if data[:2] == _GZIP_MAGIC:
+        return gzip.decompress(data)
+    if data[:4] == _ZSTD_MAGIC:
+        zstd = _zstd()
+        if zstd is None:
+            raise ImportError(
+                "zstandard is required to read this store. Install with: pip install zstandard"
+            )
+        return zstd.ZstdDecompressor().decompress(data)
+    return data
+
+
+_thread_locks: dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Hold an exclusive lock on ``path``, across threads and processes.
+
+    The lock is taken on a ``{path}.lock`` file, with ``flock``. Where that
+    isn't available (Windows), it only holds across the threads of a process.
+    """
+    if fcntl is None:  # pragma: no cover
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(str(path), threading.Lock())
+        with lock:
+            yield
+        return
+
+    with open(f"{path}.lock", 'ab') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield  # Released on close
+
+
+def append_jsonl(path: Path, record: Any) -> bool:
+    """Append a JSON line to an existing file, holding its `file_lock`.
+
+    The file is never created here, so a log that is missing (to be rebuilt
+    from its source of truth) stays missing. Returns whether it was written.
+
+    A rebuild must hold the same lock while it scans its source and rewrites
+    the log, so a record appended meanwhile lands in the rewritten log.
+    """
+    with file_lock(path):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            return False
+        with os.fdopen(fd, 'ab') as f:
+            f.write(json_dumps(record) + b'\n')
+    return True
+
+
+def read_jsonl(path: Path) -> list:
+    """Read all records of a JSON lines file."""
+    with open(path, 'rb') as f:
+        return [json_loads(line) for line in f if line.strip()]
+
+
+def write_jsonl(path: Path, records) -> None:
+    """Atomically (re)write a JSON lines file."""
+    tmp_path = Path(f"{path}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.writelines(json_dumps(record) + b'\n' for record in records)
+    os.replace(tmp_path, path)
+
+
+def file_version(path: Path) -> tuple[int, int]:
+    """A file's ``(mtime_ns, size)``, which changes whenever it is written."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return (0, 0)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def json_file_stems(dirpath: Path) -> Iterator[str]:
+    """Yield the names, minus extension, of the visible ``.json`` files in dirpath."""
+    with os.scandir(dirpath) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.endswith('.json') and not name.startswith('.') and entry.is_file():
+                yield name[: -len('.json')]
 
 
 def load_config(config_path: Optional[str] = None) -> dict:
-    """Load configuration from YAML file.
+    """Load configuration from a YAML (or, if it ends in ``.toml``, TOML) file.
 
     If config_path is None, looks for .wary.yml in current directory
     or home directory.
+
+    Parsed configs are cached until the file changes.
     """
     if config_path is None:
         # Try current directory first
@@ -20,17 +173,82 @@ def load_config(config_path: Optional[str] = None) -> dict:
             if not config_path.exists():
                 return {}
 
-    with open(config_path, "r") as f:
-        return yaml.safe_load(f) or {}
+    stat = os.stat(config_path)
+    # Copy so callers can't mutate the cached config
+    return deepcopy(_load_config_file(str(config_path), stat.st_mtime_ns, stat.st_size))
+
+
+@lru_cache(maxsize=4)
+def _load_config_file(path: str, mtime_ns: int, size: int) -> dict:
+    """Parse a config file; cached per file version (mtime and size)."""
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+
+    import yaml
+
+    # libyaml's C parser, when PyYAML was built with it
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path, "r") as f:
+        return yaml.load(f, Loader=loader) or {}
 
 
 def save_config(config: dict, config_path: Optional[str] = None):
-    """Save configuration to YAML file."""
+    """Save configuration to a YAML (or, if it ends in ``.toml``, TOML) file."""
     if config_path is None:
         config_path = Path(".wary.yml")
 
+    if str(config_path).endswith(".toml"):
+        try:
+            import tomli_w
+        except ImportError:
+            raise ImportError(
+                "tomli-w is required to save TOML configs. Install with: pip install tomli-w"
+            )
+
+        with open(config_path, "wb") as f:
+            tomli_w.dump(config, f)
+        return
+
+    import yaml
+
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
     with open(config_path, "w") as f:
-        yaml.dump(config, f, default_flow_style=False)
+        yaml.dump(config, f, Dumper=dumper, default_flow_style=False)
+
+
+# Kept-alive connections per host, for concurrent PyPI lookups
+HTTP_POOL_MAXSIZE = 64
+
+
+@lru_cache(maxsize=1)
+def http_session():
+    """The process-wide ``requests.Session`` for PyPI (and other HTTP) requests.
+
+    Connections are pooled and kept alive across calls, so repeat requests to a
+    host skip the TCP and TLS handshakes. Transient server errors are retried,
+    with backoff.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=Retry(
+            total=3, backoff_factor=0.25, status_forcelist=(500, 502, 503, 504)
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 def get_package_info(package_name: str) -> Optional[dict]:
@@ -38,23 +256,23 @@ def get_package_info(package_name: str) -> Optional[dict]:
 
     Returns dict with keys: name, version, summary, home_page, etc.
     """
-    import requests
-
     url = f"https://pypi.org/pypi/{package_name}/json"
     try:
-        response = requests.get(url, timeout=10)
+        response = http_session().get(url, timeout=10)
         response.raise_for_status()
-        data = response.json()
-        return data["info"]
+        return json_loads(response.content)["info"]
     except Exception as e:
-        print(f"Error fetching package info for {package_name}: {e}")
+        logger.warning("Error fetching package info for %s: %s", package_name, e)
         return None
 
 
+@lru_cache(maxsize=4096)
 def parse_version_constraint(constraint: str) -> tuple[str, str]:
     """Parse a version constraint like '>=1.0.0' into operator and version.
 
     Returns: (operator, version)
+
+    Cached, as the same few constraints recur across a registry's dependents.
     """
     from packaging.specifiers import SpecifierSet
 
@@ -62,10 +280,9 @@ def parse_version_constraint(constraint: str) -> tuple[str, str]:
         return ("", "")
 
     try:
-        spec = SpecifierSet(constraint)
         # Get the first specifier
-        if spec:
-            first = list(spec)[0]
+        first = next(iter(SpecifierSet(constraint)), None)
+        if first is not None:
             return (first.operator, first.version)
     except Exception:
         pass
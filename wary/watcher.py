@@ -2,46 +2,112 @@
 
 from typing import Callable, Optional
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+import asyncio
+import logging
+import threading
 import time
-import json
 
-import requests
+from wary.util import http_session, json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+# Bounds on the in-memory latest-version cache (see VersionWatcher.cache_ttl)
+LATEST_CACHE_MAXSIZE = 4096
+_N_FETCH_LOCKS = 64
+
+
+@lru_cache(maxsize=1)
+def _default_store_path() -> str:
+    import appdirs
+
+    return str(Path(appdirs.user_data_dir("wary")) / "versions")
+
+
+@lru_cache(maxsize=16)
+def _versions_store(store_path: str):
+    """The ``dol.Files`` store at ``store_path``, shared by all watchers on it."""
+    from dol import Files
+
+    return Files(store_path)
 
 
 class VersionWatcher:
     """Watch packages for new releases.
 
     Stores last-seen versions using dol.
-    """
-
-    def __init__(self, store_path: str = None):
-        if store_path is None:
-            import appdirs
 
-            store_path = Path(appdirs.user_data_dir("wary")) / "versions"
+    If ``cache_ttl`` (seconds) is set, `get_latest_version` answers from memory
+    for that long, and concurrent lookups of a package share one PyPI request.
 
-        from dol import Files
+    PyPI requests go through the shared `wary.util.http_session`, so
+    connections (and their TLS handshakes) are reused across lookups. They are
+    conditional: once a package was fetched, PyPI answers an unchanged one with
+    an empty ``304 Not Modified`` rather than its whole JSON.
+    """
 
-        self._store = Files(str(store_path))
+    def __init__(self, store_path: str = None, cache_ttl: float = 0):
+        if store_path is None:
+            store_path = _default_store_path()
+        self._store = _versions_store(str(store_path))
+        self.cache_ttl = cache_ttl
+        self._latest_cache: dict[str, tuple[float, str]] = {}
+        # {package: (etag, version)} of the last full PyPI response
+        self._etags: dict[str, tuple[str, str]] = {}
+        # Striped, so the number of locks stays bounded
+        self._fetch_locks = [threading.Lock() for _ in range(_N_FETCH_LOCKS)]
 
     def get_latest_version(self, package: str) -> Optional[str]:
-        """Fetch latest version from PyPI."""
+        """Fetch latest version from PyPI (or the cache, if ``cache_ttl`` is set)."""
+        if not self.cache_ttl:
+            return self._fetch_latest_version(package)
+
+        version = self._cached_latest_version(package)
+        if version is not None:
+            return version
+        with self._fetch_locks[hash(package) % _N_FETCH_LOCKS]:
+            # Another thread may have fetched it while we waited
+            version = self._cached_latest_version(package)
+            if version is None:
+                version = self._fetch_latest_version(package)
+                if version is not None:
+                    if len(self._latest_cache) >= LATEST_CACHE_MAXSIZE:
+                        self._latest_cache.clear()
+                    self._latest_cache[package] = (time.monotonic(), version)
+        return version
+
+    def _cached_latest_version(self, package: str) -> Optional[str]:
+        cached = self._latest_cache.get(package)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1]
+        return None
+
+    def _fetch_latest_version(self, package: str) -> Optional[str]:
         url = f"https://pypi.org/pypi/{package}/json"
+        known = self._etags.get(package)
+        headers = {"If-None-Match": known[0]} if known else None
         try:
-            response = requests.get(url, timeout=10)
+            response = http_session().get(url, headers=headers, timeout=10)
+            if response.status_code == 304 and known:
+                return known[1]
             response.raise_for_status()
-            data = response.json()
-            return data["info"]["version"]
+            version = json_loads(response.content)["info"]["version"]
+            etag = response.headers.get("ETag")
+            if etag:
+                if len(self._etags) >= LATEST_CACHE_MAXSIZE:
+                    self._etags.clear()
+                self._etags[package] = (etag, version)
+            return version
         except Exception as e:
-            print(f"Error fetching {package}: {e}")
+            logger.warning("Error fetching %s: %s", package, e)
             return None
 
     def get_stored_version(self, package: str) -> Optional[str]:
         """Get last-seen version from storage."""
         try:
             data_bytes = self._store[f"{package}.json"]
-            data = json.loads(data_bytes.decode('utf-8'))
+            data = json_loads(data_bytes)
             return data["version"]
         except KeyError:
             return None
@@ -49,7 +115,7 @@ class VersionWatcher:
     def update_stored_version(self, package: str, version: str):
         """Store version."""
         data = {"version": version, "checked_at": datetime.now().isoformat()}
-        self._store[f"{package}.json"] = json.dumps(data).encode('utf-8')
+        self._store[f"{package}.json"] = json_dumps(data)
 
     def check_for_updates(
         self,
@@ -63,15 +129,34 @@ class VersionWatcher:
 
         Callback is called with (package, old_ver, new_ver).
         """
-        updates = {}
+        return asyncio.run(self.acheck_for_updates(packages, callback))
 
-        for package in packages:
-            stored_version = self.get_stored_version(package)
-            latest_version = self.get_latest_version(package)
+    async def acheck_for_updates(
+        self,
+        packages: list[str],
+        callback: Callable[[str, str, str], None] = None,
+        max_concurrent: int = 32,
+    ) -> dict[str, tuple[str, str]]:
+        """Async `check_for_updates`, fetching PyPI versions concurrently.
+
+        At most ``max_concurrent`` requests are in flight at once.
+        """
+        sem = asyncio.Semaphore(max_concurrent)
 
+        async def _latest(package):
+            async with sem:
+                return await asyncio.to_thread(self.get_latest_version, package)
+
+        latest_versions = await asyncio.gather(*map(_latest, packages))
+
+        updates = {}
+
+        for package, latest_version in zip(packages, latest_versions):
             if latest_version is None:
                 continue
 
+            stored_version = self.get_stored_version(package)
+
             if stored_version != latest_version:
                 updates[package] = (stored_version, latest_version)
                 self.update_stored_version(package, latest_version)